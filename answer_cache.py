@@ -0,0 +1,130 @@
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from array import array
+
+
+def context_fingerprint(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class AnswerCache:
+    # Finished answers keyed by the question's embedding plus a fingerprint
+    # of everything else that went into the prompt (retrieved context, graph
+    # connections, chat history, model). A lookup only considers entries
+    # with the same scope (collection), index stamp and fingerprint, and
+    # returns one whose question embedding is at least `threshold`
+    # cosine-similar. When the stamp of a scope moves on (new chunks or
+    # edges), its older entries are dropped. Bounded by max_bytes (LRU) and max_age like LLMCache.
+    def __init__(self, db_path, threshold=0.95, max_bytes=16 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.db_path = str(db_path)
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                stamp TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_lookup ON answers (scope, stamp, fingerprint)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_accessed ON answers (accessed_at)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+
+    def get(self, scope, stamp, fingerprint, vector):
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, vector, answer, created_at FROM answers WHERE scope = ? AND stamp = ? AND fingerprint = ?",
+                (scope, stamp, fingerprint),
+            ).fetchall()
+            best = None
+            best_sim = self.threshold
+            for row_id, blob, answer, created_at in rows:
+                if now - created_at > self.max_age:
+                    continue
+                stored = array("f")
+                stored.frombytes(blob)
+                sim = _cosine(vector, stored)
+                if sim >= best_sim:
+                    best, best_sim = (row_id, answer), sim
+            if best is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET accessed_at = ? WHERE id = ?", (now, best[0]))
+            self._conn.commit()
+            self.hits += 1
+            return best[1]
+
+    def put(self, scope, stamp, fingerprint, question, vector, answer):
+        blob = array("f", (float(v) for v in vector)).tobytes()
+        size = len(answer.encode("utf-8")) + len(question.encode("utf-8")) + len(blob)
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM answers WHERE scope = ? AND stamp != ?", (scope, stamp))
+            if cur.rowcount:
+                self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO answers (scope, stamp, fingerprint, question, vector, answer, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, stamp, fingerprint, question, blob, answer, size, now, now),
+            )
+            self._total += size
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        cur = self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.max_age,))
+        if cur.rowcount:
+            self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if self._total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT id, size FROM answers ORDER BY accessed_at ASC").fetchall()
+        doomed = []
+        for row_id, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            doomed.append((row_id,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM answers WHERE id = ?", doomed)
+
+    def drop(self, scope):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE scope = ?", (scope,))
+            self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._total = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": self._total}
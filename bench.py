@@ -0,0 +1,374 @@
+import argparse
+import hashlib
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chromadb import EmbeddingFunction
+
+import tracing
+from processor import HiveProcessor
+from util import ChatMemory
+
+
+VOCAB = (
+    "attention backpropagation transformer gradient descent convolution embedding "
+    "regularization dropout optimizer entropy likelihood inference posterior prior "
+    "sampling kernel manifold encoder decoder latent variational reinforcement policy "
+    "reward graph node edge spectral clustering retrieval augmentation corpus token"
+).split()
+
+
+class FakeHiveMind:
+    # Deterministic stand-in for util.HiveMind: no network, configurable
+    # latency, and triples derived from a hash of the chunk so repeated runs
+    # build the same graph.
+    def __init__(self, latency=0.0, answer_latency=0.0, triples_per_chunk=4, entities=200, seed=0):
+        self.latency = latency
+        self.answer_latency = answer_latency
+        self.triples_per_chunk = triples_per_chunk
+        self.entities = [f"Concept{i}" for i in range(entities)]
+        self.seed = seed
+        self.calls = 0
+
+    def extract_entities_and_relations(self, text_chunk):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.sha256(f"{self.seed}:{text_chunk}".encode("utf-8")).digest()
+        rnd = random.Random(digest)
+        lines = []
+        for _ in range(self.triples_per_chunk):
+            a, b = rnd.sample(self.entities, 2)
+            lines.append(f"({a}, {rnd.choice(VOCAB)}, {b})")
+        return "\n".join(lines)
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if self.answer_latency:
+            time.sleep(self.answer_latency)
+
+        class _Resp:
+            def __init__(self, text):
+                self.text = text
+
+        return _Resp(f"Answer based on {len(prompt)} prompt characters.")
+
+    def generate_content_stream(self, prompt):
+        yield self.generate_content(prompt).text
+
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    # Cheap, offline embedding so benchmarks measure the pipeline rather
+    # than model download or inference time.
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            vec = [0.0] * self.dim
+            for word in text.lower().split():
+                h = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+                vec[h % self.dim] += 1.0
+            norm = sum(v * v for v in vec) ** 0.5 or 1.0
+            vectors.append([v / norm for v in vec])
+        return vectors
+
+    @staticmethod
+    def name():
+        return "hivemind-bench-hash"
+
+    def get_config(self):
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction(config.get("dim", 384))
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_synthetic_pdf(path, pages=10, lines_per_page=45, words_per_line=12, seed=0):
+    # Minimal hand-written PDF (Helvetica text only) that PyPDF2 can read,
+    # so no PDF authoring dependency is needed.
+    rnd = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for _ in range(pages):
+        lines = []
+        for _ in range(lines_per_page):
+            words = [rnd.choice(VOCAB) for _ in range(words_per_line)]
+            if rnd.random() < 0.3:
+                words.insert(rnd.randrange(len(words)), f"Concept{rnd.randrange(200)}")
+            lines.append(" ".join(words).capitalize() + ".")
+        stream = "BT /F1 9 Tf 40 760 Td 14 TL\n"
+        stream += "\n".join(f"({_pdf_escape(line)}) '" for line in lines)
+        stream += "\nET"
+        data = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode("ascii"),
+        len(kids),
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(bytes(out))
+    return path
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(50) * 1000,
+        "p90_ms": pct(90) * 1000,
+        "p99_ms": pct(99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _processor(workdir, core):
+    # The answer cache is off so repeated benchmark questions still measure
+    # the full query path; bench_query times cache hits separately.
+    return HiveProcessor(core, data_dir=workdir, embedding_function=HashEmbeddingFunction(), use_answer_cache=False)
+
+
+def bench_ingest(workdir, sizes, latency):
+    results = []
+    for pages in sizes:
+        pdf = write_synthetic_pdf(Path(workdir) / f"synthetic_{pages}p.pdf", pages=pages, seed=pages)
+        core = FakeHiveMind(latency=latency)
+        engine = _processor(Path(workdir) / f"ingest_{pages}", core)
+        start = time.perf_counter()
+        engine.process_pdf(str(pdf))
+        elapsed = time.perf_counter() - start
+        chunks = engine.collection.count()
+        results.append({
+            "pages": pages,
+            "chunks": chunks,
+            "llm_calls": core.calls,
+            "seconds": elapsed,
+            "chunks_per_sec": chunks / elapsed if elapsed > 0 else 0.0,
+            "edges": engine.graph.number_of_edges(),
+        })
+    return results
+
+
+def bench_query(workdir, sizes, queries):
+    results = []
+    rnd = random.Random(7)
+    for entities in sizes:
+        core = FakeHiveMind(entities=entities)
+        engine = _processor(Path(workdir) / f"query_{entities}", core)
+        chunks = [
+            " ".join(rnd.choice(VOCAB + core.entities[:50]) for _ in range(150))
+            for _ in range(max(50, entities // 4))
+        ]
+        engine.add_chunks("synthetic.pdf", chunks)
+        for start in range(0, entities * 3, 200):
+            lines = []
+            for _ in range(min(200, entities * 3 - start)):
+                a, b = rnd.sample(core.entities, 2)
+                lines.append(f"({a}, {rnd.choice(VOCAB)}, {b})")
+            engine.parse_and_add_to_graph("\n".join(lines))
+
+        samples = []
+        for i in range(queries):
+            mention = rnd.choice(core.entities)
+            question = f"How does {mention} relate to {rnd.choice(VOCAB)}?"
+            start = time.perf_counter()
+            engine.query_nexus(question, session_id=f"bench-{entities}")
+            samples.append(time.perf_counter() - start)
+
+        engine.use_answer_cache = True
+        question = f"How does {core.entities[0]} relate to {VOCAB[0]}?"
+        engine.query_nexus(question)
+        start = time.perf_counter()
+        engine.query_nexus(question)
+        cached_ms = (time.perf_counter() - start) * 1000
+
+        entry = {
+            "nodes": engine.graph.number_of_nodes(),
+            "edges": engine.graph.number_of_edges(),
+            "chunks": engine.collection.count(),
+            "answer_cache_hit_ms": cached_ms,
+        }
+        entry.update(percentiles(samples))
+        results.append(entry)
+    return results
+
+
+def bench_memory(workdir, exchanges):
+    memory = ChatMemory(Path(workdir) / "bench_history.db")
+    sessions = [f"session-{i}" for i in range(max(1, exchanges // 20))]
+    start = time.perf_counter()
+    for i in range(exchanges):
+        memory.add_exchange(sessions[i % len(sessions)], f"question {i}", f"answer {i} " * 20)
+    write_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(exchanges):
+        memory.get_recent_context(sessions[i % len(sessions)])
+    read_elapsed = time.perf_counter() - start
+
+    list_samples = []
+    for _ in range(20):
+        start = time.perf_counter()
+        memory.list_sessions(limit=100)
+        list_samples.append(time.perf_counter() - start)
+
+    return {
+        "exchanges": exchanges,
+        "writes_per_sec": exchanges / write_elapsed if write_elapsed > 0 else 0.0,
+        "reads_per_sec": exchanges / read_elapsed if read_elapsed > 0 else 0.0,
+        "list_sessions": percentiles(list_samples),
+    }
+
+
+def bench_render(sizes):
+    import matplotlib
+    matplotlib.use("Agg")
+    import networkx as nx
+    from visualizer import GraphVisualizer
+
+    results = []
+    for nodes in sizes:
+        # The full-draw numbers keep level of detail off so they stay
+        # comparable across revisions; lod_ms is the default view.
+        viz = GraphVisualizer(None, node_budget=None)
+        graph = nx.gnm_random_graph(nodes, int(nodes * 1.5), seed=nodes, directed=True)
+        start = time.perf_counter()
+        viz.update_graph(graph)
+        viz.canvas.draw()
+        full = time.perf_counter() - start
+
+        rnd = random.Random(nodes)
+        for i in range(10):
+            graph.add_edge(nodes + i, rnd.randrange(nodes))
+        start = time.perf_counter()
+        viz.update_graph(graph)
+        viz.canvas.draw()
+        incremental = time.perf_counter() - start
+
+        lod = GraphVisualizer(None)
+        lod.update_graph(graph)
+        start = time.perf_counter()
+        lod.update_graph(graph, focus=[0])
+        lod.canvas.draw()
+        lod_elapsed = time.perf_counter() - start
+        results.append({
+            "nodes": nodes,
+            "full_ms": full * 1000,
+            "incremental_ms": incremental * 1000,
+            "lod_ms": lod_elapsed * 1000,
+            "lod_nodes": len(lod._pos),
+        })
+    return results
+
+
+SCENARIOS = ("ingest", "query", "memory", "render")
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run(scenarios=SCENARIOS, quick=False, llm_latency=0.0, workdir=None):
+    owns_workdir = workdir is None
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="hivemind_bench_"))
+    try:
+        report = {
+            "meta": {
+                "revision": _git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "quick": quick,
+                "llm_latency": llm_latency,
+            },
+            "scenarios": {},
+        }
+        if "ingest" in scenarios:
+            sizes = [2, 10] if quick else [5, 25, 100]
+            report["scenarios"]["ingest"] = bench_ingest(workdir, sizes, llm_latency)
+        if "query" in scenarios:
+            sizes = [100, 500] if quick else [100, 1000, 5000]
+            report["scenarios"]["query"] = bench_query(workdir, sizes, 20 if quick else 100)
+        if "memory" in scenarios:
+            report["scenarios"]["memory"] = bench_memory(workdir, 500 if quick else 5000)
+        if "render" in scenarios:
+            report["scenarios"]["render"] = bench_render([50, 150] if quick else [50, 200, 500])
+        return report
+    finally:
+        if owns_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline HIVEMIND benchmarks (no API key or display needed).")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Run only these scenarios (repeatable).")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per extraction call.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--trace", help="Record per-stage spans and write a Chrome trace JSON file here.")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        tracing.enable()
+    report = run(scenarios=args.scenario or SCENARIOS, quick=args.quick, llm_latency=args.llm_latency)
+    if args.trace:
+        tracing.export_chrome_trace(args.trace)
+        report["stages"] = tracing.summary()
+        sys.stderr.write(tracing.summary_table() + "\n")
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
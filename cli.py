@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import sys
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import processor
+import util
+from pipeline import IngestPipeline
+
+
+DEFAULT_COLLECTION = "research_papers_default"
+
+
+def collect_pdfs(paths, recursive=True):
+    files = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            pattern = "**/*.pdf" if recursive else "*.pdf"
+            files.extend(sorted(str(p) for p in path.glob(pattern) if p.is_file()))
+        elif path.suffix.lower() == ".pdf" and path.is_file():
+            files.append(str(path))
+    return files
+
+
+def build_engine(collection, api_key=None):
+    return processor.HiveProcessor(util.HiveMind(api_key or os.getenv("GENAI_API_KEY")), collection_name=collection)
+
+
+def _print_progress(event):
+    name = os.path.basename(event["file"])
+    if event["status"] == "indexed":
+        print(f"[{event['done']}/{event['total']}] indexed {name} ({event['chunks']} chunks, "
+              f"{event['chunks_per_sec']:.1f} chunks/s)", flush=True)
+    elif event["status"] == "error":
+        print(f"[{event['done']}/{event['total']}] failed {name}: {event['error']}", file=sys.stderr, flush=True)
+
+
+class HiveService:
+    # Shared warm engine for the HTTP API. Queries hold the read side of the
+    # lock only while retrieving and building the prompt (not during the LLM
+    # call); ingest writes take the write side batch by batch, so queries
+    # interleave with a long ingest.
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = util.RWLock()
+
+    def ingest(self, paths, recursive=True):
+        files = collect_pdfs(paths, recursive=recursive)
+        stats = IngestPipeline(self.engine, write_lock=self.lock.writer).run(files)
+        stats["requested"] = len(files)
+        return stats
+
+    def query(self, question, session_id=None):
+        session_id = session_id or str(uuid.uuid4())
+        report = {}
+        answer = self.engine.query_nexus(question, session_id=session_id, read_lock=self.lock.reader, report=report)
+        return {"session_id": session_id, "answer": answer, "cached": report["cached"], "context": report["context"]}
+
+    def sessions(self, limit=100, before=None):
+        return self.engine.list_sessions(limit=limit, before=before)
+
+    def session_messages(self, session_id, after_id=None, limit=None):
+        if limit is None:
+            return [
+                {"role": role, "content": content, "created_at": created_at}
+                for role, content, created_at in self.engine.get_session_messages(session_id)
+            ]
+        return [
+            {"id": msg_id, "role": role, "content": content, "created_at": created_at}
+            for msg_id, role, content, created_at in self.engine.get_messages_page(
+                session_id, after_id=after_id, limit=limit
+            )
+        ]
+
+    def search(self, text, limit=50, offset=0):
+        return self.engine.search_messages(text, limit=limit, offset=offset)
+
+    def message_context(self, message_id):
+        # Chunks are read back from their collection, so this holds the read
+        # side like a query's retrieval.
+        with self.lock.reader:
+            return self.engine.get_message_context(message_id)
+
+    def graph(self):
+        with self.lock.reader:
+            graph = self.engine.graph
+            return {
+                "collection": self.engine.collection.name,
+                "nodes": list(graph.nodes),
+                "edges": [
+                    {
+                        "source": u,
+                        "target": v,
+                        "relation": data.get("relation", ""),
+                        "weight": data.get("weight", 1),
+                        "relations": data.get("relations", {}),
+                    }
+                    for u, v, data in graph.edges(data=True)
+                ],
+            }
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                if parts == ["sessions"]:
+                    # Next page: pass before_end/before_id from the last session returned.
+                    before = None
+                    if "before_end" in params and "before_id" in params:
+                        before = (params["before_end"], params["before_id"])
+                    return self._send(200, service.sessions(limit=int(params.get("limit", 100)), before=before))
+                if len(parts) == 2 and parts[0] == "sessions":
+                    limit = int(params["limit"]) if "limit" in params else None
+                    after_id = int(params["after"]) if "after" in params else None
+                    return self._send(200, service.session_messages(parts[1], after_id=after_id, limit=limit))
+                if parts == ["search"]:
+                    if not params.get("q"):
+                        return self._send(400, {"error": "missing 'q'"})
+                    return self._send(200, service.search(
+                        params["q"], limit=int(params.get("limit", 50)), offset=int(params.get("offset", 0))
+                    ))
+                if parts == ["graph"]:
+                    return self._send(200, service.graph())
+                if len(parts) == 3 and parts[0] == "messages" and parts[2] == "context":
+                    context = service.message_context(int(parts[1]))
+                    if context is None:
+                        return self._send(404, {"error": f"no stored context for message {parts[1]}"})
+                    return self._send(200, context)
+                return self._send(404, {"error": f"unknown endpoint {url.path}"})
+            except Exception as e:
+                return self._send(500, {"error": str(e)})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                body = self._body()
+            except ValueError:
+                return self._send(400, {"error": "request body must be JSON"})
+            try:
+                if url.path == "/query":
+                    question = body.get("question")
+                    if not question:
+                        return self._send(400, {"error": "missing 'question'"})
+                    return self._send(200, service.query(question, body.get("session_id")))
+                if url.path == "/ingest":
+                    paths = body.get("paths")
+                    if not paths:
+                        return self._send(400, {"error": "missing 'paths'"})
+                    return self._send(200, service.ingest(paths, recursive=body.get("recursive", True)))
+                return self._send(404, {"error": f"unknown endpoint {url.path}"})
+            except Exception as e:
+                return self._send(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+    return Handler
+
+
+def cmd_ingest(args):
+    files = collect_pdfs(args.paths, recursive=not args.no_recursive)
+    if not files:
+        print("No PDF files found.", file=sys.stderr)
+        return 1
+    engine = build_engine(args.collection)
+    print(f"Ingesting {len(files)} files into {engine.collection.name}", flush=True)
+    stats = IngestPipeline(engine, llm_workers=args.llm_workers, on_progress=_print_progress).run(files)
+    print(f"Done: {stats['files']} indexed, {stats['failed']} failed, {stats['chunks']} chunks "
+          f"in {stats['elapsed']:.1f}s")
+    return 0 if not stats["failed"] else 2
+
+
+def cmd_query(args):
+    engine = build_engine(args.collection)
+    session_id = args.session or str(uuid.uuid4())
+    print(engine.query_nexus(args.question, session_id=session_id))
+    return 0
+
+
+def cmd_serve(args):
+    service = HiveService(build_engine(args.collection))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving {service.engine.collection.name} on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_compact(args):
+    # Only the stores are opened: building an engine would create and
+    # register the default collection just to compact around it.
+    report = processor.compact_collections(
+        keep_last=args.keep_last, max_age_days=args.max_age_days, dry_run=args.dry_run, protect=[args.collection]
+    )
+    verb = "Would drop" if args.dry_run else "Dropped"
+    for name, reason in sorted(report["dropped"].items()):
+        print(f"{verb} {name} ({reason})")
+    print(f"{verb} {len(report['dropped'])} collections, kept {len(report['kept'])}, "
+          f"pruned {len(report['stale_registry_rows'])} stale registry rows")
+    if not args.dry_run:
+        print(f"Removed {processor.compact_history()} unused context blobs from the chat history")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless HIVEMIND: bulk ingest, query, or serve over HTTP.")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Chroma collection to open or create.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="Index PDF files or directories of PDFs.")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--no-recursive", action="store_true", help="Do not descend into subdirectories.")
+    p.add_argument("--llm-workers", type=int, default=4)
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("query", help="Ask a single question.")
+    p.add_argument("question")
+    p.add_argument("--session", help="Session id to attach the exchange to.")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("serve", help="Run the local HTTP API.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("compact", help="Drop orphaned, empty and expired collections and reclaim disk space.")
+    p.add_argument("--keep-last", type=int, default=5, help="Always keep this many most recently used collections.")
+    p.add_argument("--max-age-days", type=float, default=30, help="Drop collections idle for longer than this.")
+    p.add_argument("--dry-run", action="store_true", help="Only report what would be dropped.")
+    p.set_defaults(func=cmd_compact)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
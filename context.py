@@ -0,0 +1,115 @@
+import re
+
+
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting English prose
+    # and avoids loading a tokenizer on the query path.
+    return max(1, (len(text) + 3) // 4)
+
+
+def _fingerprint(text):
+    return " ".join(text.lower().split())
+
+
+def _shingles(text):
+    return set(_WORD.findall(text.lower()))
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def trim_history(history, token_budget):
+    # Keeps the most recent lines of the chat history that fit the budget.
+    if not history or token_budget <= 0:
+        return ""
+    kept = []
+    used = 0
+    for line in reversed(history.splitlines()):
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
+
+
+class ContextPacker:
+    # Turns retrieval candidates into a prompt context that fits a token
+    # budget. Candidates are dicts with "id", "text" and "score" (higher is
+    # more relevant). Steps: drop repeated ids and repeated text, order by
+    # maximal marginal relevance so near-duplicates sink, then greedily fill
+    # the budget. Every tie is broken by id, so identical inputs always give
+    # the identical context.
+    def __init__(self, token_budget=3000, history_budget=600, mmr_lambda=0.7):
+        self.token_budget = token_budget
+        self.history_budget = history_budget
+        self.mmr_lambda = mmr_lambda
+
+    def pack(self, candidates):
+        dropped = []
+        best = {}
+        for cand in candidates:
+            current = best.get(cand["id"])
+            if current is None or cand["score"] > current["score"]:
+                if current is not None:
+                    dropped.append({"id": current["id"], "reason": "duplicate_id"})
+                best[cand["id"]] = cand
+            else:
+                dropped.append({"id": cand["id"], "reason": "duplicate_id"})
+
+        unique = {}
+        for cand in sorted(best.values(), key=lambda c: (-c["score"], c["id"])):
+            key = _fingerprint(cand["text"])
+            if key in unique:
+                dropped.append({"id": cand["id"], "reason": "duplicate_text"})
+                continue
+            unique[key] = cand
+
+        ranked = self._mmr(list(unique.values()))
+
+        selected = []
+        used = 0
+        for cand in ranked:
+            cost = estimate_tokens(cand["text"])
+            if used + cost > self.token_budget:
+                dropped.append({"id": cand["id"], "reason": "budget", "tokens": cost})
+                continue
+            selected.append(cand)
+            used += cost
+
+        return {
+            "text": "\n".join(c["text"] for c in selected),
+            "selected": [c["id"] for c in selected],
+            "dropped": dropped,
+            "tokens": used,
+        }
+
+    def _mmr(self, candidates):
+        remaining = sorted(candidates, key=lambda c: (-c["score"], c["id"]))
+        shingles = {c["id"]: _shingles(c["text"]) for c in remaining}
+        max_score = max((c["score"] for c in remaining), default=1.0) or 1.0
+        max_sim = {c["id"]: 0.0 for c in remaining}
+        ranked = []
+        while remaining:
+            # remaining stays sorted by (-score, id), so a strict comparison
+            # resolves ties towards the higher-scored, lower id candidate.
+            pick = None
+            best = None
+            for c in remaining:
+                value = self.mmr_lambda * c["score"] / max_score - (1 - self.mmr_lambda) * max_sim[c["id"]]
+                if best is None or value > best:
+                    pick, best = c, value
+            remaining.remove(pick)
+            ranked.append(pick)
+            picked = shingles[pick["id"]]
+            for c in remaining:
+                sim = _similarity(picked, shingles[c["id"]])
+                if sim > max_sim[c["id"]]:
+                    max_sim[c["id"]] = sim
+        return ranked
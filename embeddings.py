@@ -0,0 +1,120 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+import tracing
+
+
+def _model_name(embedding_function):
+    name = getattr(embedding_function, "name", None)
+    if callable(name):
+        try:
+            value = name()
+            if isinstance(value, str):
+                return value
+        except Exception:
+            pass
+    return type(embedding_function).__name__
+
+
+class EmbeddingCache:
+    # Persistent store of embedding vectors keyed by sha256(model + text), so
+    # identical chunks are embedded once no matter how many collections or
+    # sessions they are written to. Vectors are stored as float32 blobs.
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        keys = [self.make_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [found.get(k) for k in keys]
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vec = array("f", (float(v) for v in vector))
+            rows.append((self.make_key(model, text), model, len(vec), vec.tobytes(), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+class CachedEmbedder:
+    # Embedding layer used by HiveProcessor. Any Chroma-compatible embedding
+    # function can be plugged in; texts are deduplicated, looked up in the
+    # cache, and only the misses are embedded, batch_size at a time.
+    def __init__(self, embedding_function=None, cache=None, batch_size=64, model_name=None):
+        if embedding_function is None:
+            from chromadb.utils import embedding_functions
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.batch_size = max(1, int(batch_size))
+        self.model_name = model_name or _model_name(embedding_function)
+
+    def embed(self, texts):
+        texts = list(texts)
+        unique = list(dict.fromkeys(texts))
+        if self.cache is not None:
+            cached = self.cache.get_many(self.model_name, unique)
+        else:
+            cached = [None] * len(unique)
+        vectors = dict(zip(unique, cached))
+        missing = [t for t in unique if vectors[t] is None]
+        tracing.count("embed.cache_hits", len(unique) - len(missing))
+        tracing.count("embed.cache_misses", len(missing))
+
+        for start in range(0, len(missing), self.batch_size):
+            part = missing[start:start + self.batch_size]
+            with tracing.span("embed.batch", texts=len(part)):
+                # Round through float32 so fresh and cached vectors match.
+                computed = [array("f", (float(v) for v in vec)).tolist() for vec in self.embedding_function(part)]
+            if self.cache is not None:
+                self.cache.put_many(self.model_name, part, computed)
+            vectors.update(zip(part, computed))
+
+        return [vectors[t] for t in texts]
@@ -0,0 +1,195 @@
+import contextlib
+import heapq
+from collections import Counter
+
+
+class NodeRank:
+    # Weighted PageRank over the knowledge graph. Edge writes only mark it
+    # stale; whoever writes the graph calls refresh() after a batch, which
+    # runs power iteration warm-started from the previous scores, so after a
+    # small ingest it converges in a handful of sweeps instead of starting
+    # from uniform. Readers get the last computed scores and never pay for a
+    # recompute, except for a rank that was never computed at all.
+    def __init__(self, damping=0.85, tol=1e-6, max_iter=100):
+        self.damping = damping
+        self.tol = tol
+        self.max_iter = max_iter
+        self.scores = {}
+        self.max_score = 0.0
+        self.iterations = 0
+        self._stale = True
+
+    def invalidate(self):
+        self._stale = True
+
+    def clear(self):
+        self.scores = {}
+        self.max_score = 0.0
+        self._stale = True
+
+    def refresh(self, graph, lock=None):
+        # Only the snapshot of nodes and edge weights is taken under lock
+        # (the graph writers' lock); the sweeps run outside it. Returns
+        # whether anything was recomputed.
+        if not self._stale:
+            return False
+        with lock if lock is not None else contextlib.nullcontext():
+            self._stale = False
+            nodes = list(graph.nodes)
+            edges = [(source, target, data.get("weight", 1)) for source, target, data in graph.edges(data=True)]
+        self._compute(nodes, edges)
+        return True
+
+    def get(self, graph):
+        if self._stale and not self.scores:
+            self.refresh(graph)
+        return self.scores
+
+    def importance(self, graph, node):
+        # Rank scaled to 0..1 against the most central node.
+        scores = self.get(graph)
+        if not self.max_score:
+            return 0.0
+        return scores.get(node, 0.0) / self.max_score
+
+    def _compute(self, nodes, edges):
+        n = len(nodes)
+        if not n:
+            self.scores, self.max_score, self.iterations = {}, 0.0, 0
+            return
+        out_weight = dict.fromkeys(nodes, 0)
+        for source, _, weight in edges:
+            out_weight[source] += weight
+        dangling = [node for node in nodes if not out_weight[node]]
+
+        previous = self.scores
+        rank = {node: previous.get(node, 1.0 / n) for node in nodes}
+        total = sum(rank.values())
+        rank = {node: value / total for node, value in rank.items()}
+
+        base = (1.0 - self.damping) / n
+        iterations = 0
+        for iterations in range(1, self.max_iter + 1):
+            leak = self.damping * sum(rank[node] for node in dangling) / n
+            new = dict.fromkeys(nodes, base + leak)
+            for source, target, weight in edges:
+                new[target] += self.damping * rank[source] * weight / out_weight[source]
+            delta = sum(abs(new[node] - rank[node]) for node in nodes)
+            rank = new
+            if delta < n * self.tol:
+                break
+
+        self.scores, self.max_score, self.iterations = rank, max(rank.values()), iterations
+
+
+class Communities:
+    # Community of every node, used to collapse the graph view. A full
+    # Louvain pass runs on first use and again once the graph has grown by
+    # `regrow` since the last one; in between, new nodes join the community
+    # most common among their already assigned neighbors (or start their
+    # own), which costs only their degree. Community ids are the name of the
+    # best-connected member, so they stay stable across passes.
+    def __init__(self, regrow=0.25, seed=42):
+        self.regrow = regrow
+        self.seed = seed
+        self.clear()
+
+    def clear(self):
+        self.assignment = {}
+        self.members = {}
+        self.full_size = 0
+
+    def needs_full(self, graph):
+        return not self.full_size or graph.number_of_nodes() > self.full_size * (1 + self.regrow)
+
+    def compute_full(self, graph):
+        # Safe to run on a worker thread over a copy of the graph; the new
+        # tables replace the old ones in one assignment each.
+        import networkx as nx
+
+        undirected = graph.to_undirected()
+        try:
+            parts = nx.community.louvain_communities(undirected, weight="weight", seed=self.seed)
+        except Exception:
+            parts = nx.community.label_propagation_communities(undirected)
+        assignment = {}
+        members = {}
+        for part in parts:
+            cid = max(part, key=lambda n: (undirected.degree(n), str(n)))
+            members[cid] = list(part)
+            for node in part:
+                assignment[node] = cid
+        self.assignment = assignment
+        self.members = members
+        self.full_size = graph.number_of_nodes()
+
+    def update(self, graph):
+        if len(self.assignment) == graph.number_of_nodes():
+            return
+        import networkx as nx
+
+        assignment = self.assignment
+        members = self.members
+        for node in list(graph.nodes):
+            if node in assignment:
+                continue
+            votes = Counter(assignment[m] for m in nx.all_neighbors(graph, node) if m in assignment)
+            cid = votes.most_common(1)[0][0] if votes else node
+            assignment[node] = cid
+            members.setdefault(cid, []).append(node)
+
+
+def _edge_strength(weight):
+    # 1 extraction -> 0.5, 3 -> 0.75; repeated evidence counts, with
+    # diminishing returns so one chatty document cannot dominate.
+    return weight / (weight + 1.0)
+
+
+def best_first_paths(graph, seeds, rank, max_hops=2, max_paths=12, max_expansions=200, branch_limit=None):
+    # Budgeted best-first search from the seed entities along outgoing edges.
+    # A path's score is the product, over its edges, of edge strength, the
+    # end node's importance, and a 0.5 decay for every hop after the first;
+    # every factor is <= 1, so paths pop off the heap in descending score
+    # order and the first max_paths popped are the top-N. Each node ends at
+    # most one path (its best one), each expanded node contributes at most
+    # branch_limit neighbors (default a third of max_paths, so one hub cannot
+    # fill the whole result), and at most max_expansions nodes are expanded,
+    # so the cost is bounded regardless of how large the hubs are.
+    # Returns [(score, [node, ...], [relation, ...])].
+    if branch_limit is None:
+        branch_limit = max(2, max_paths // 3)
+    heap = []
+    counter = 0
+    for seed in dict.fromkeys(seeds):
+        if seed in graph:
+            heapq.heappush(heap, (-1.0, counter, [seed], []))
+            counter += 1
+
+    done = set()
+    paths = []
+    expansions = 0
+    while heap and len(paths) < max_paths:
+        neg_score, _, nodes, relations = heapq.heappop(heap)
+        score = -neg_score
+        tail = nodes[-1]
+        if tail in done:
+            continue
+        done.add(tail)
+        if relations:
+            paths.append((score, nodes, relations))
+        hops = len(relations)
+        if hops >= max_hops or expansions >= max_expansions:
+            continue
+        expansions += 1
+
+        decay = 1.0 if hops == 0 else 0.5
+        steps = []
+        for neighbor, data in graph[tail].items():
+            if neighbor in done or neighbor in nodes:
+                continue
+            importance = 0.5 + 0.5 * rank.importance(graph, neighbor)
+            steps.append((score * decay * _edge_strength(data.get("weight", 1)) * importance, neighbor, data))
+        for step_score, neighbor, data in heapq.nlargest(branch_limit, steps, key=lambda s: (s[0], s[1])):
+            heapq.heappush(heap, (-step_score, counter, nodes + [neighbor], relations + [data.get("relation", "")]))
+            counter += 1
+    return paths
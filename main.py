@@ -1,14 +1,30 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import processor
-import util
 import os
 import threading
-import visualizer
-from visualizer import GraphVisualizer
+import queue
+from collections import deque
+import util
+from pipeline import IngestPipeline
+from markdown_render import insert_args, render_markdown, span_length
 import uuid
 
 
+# The chat panel keeps at most this many turns (exchanges and system notes);
+# older ones are trimmed and can be reloaded from ChatMemory, LOAD_EARLIER_ROWS
+# messages at a time.
+MAX_CHAT_TURNS = 40
+LOAD_EARLIER_ROWS = 40
+# Sessions, search results and transcript messages per history-window page.
+HISTORY_PAGE = 50
+
+
+def _message_spans(role, content):
+    if role == "user":
+        return [("User: ", ("user_tag",))] + render_markdown(content)
+    return [("Nexus: ", ("nexus_tag",))] + render_markdown(content) + [("\n", ())]
+
+
 class NexusApp:
     def __init__(self, root):
         self.root = root
@@ -35,6 +51,11 @@ class NexusApp:
         self.history_btn = tk.Button(self.session_frame, text="View History", command=self.show_history)
         self.history_btn.pack(side=tk.LEFT)
 
+        self.load_earlier_btn = tk.Button(
+            self.session_frame, text="Load Earlier", command=self.load_earlier, state=tk.DISABLED
+        )
+        self.load_earlier_btn.pack(side=tk.LEFT, padx=(5, 0))
+
         self.chat_history = tk.Text(self.left_frame, height=20, width=60)
         self.chat_history.pack(padx=8, pady=8, fill=tk.BOTH, expand=True)
         # Text tags for simple markdown rendering
@@ -55,63 +76,396 @@ class NexusApp:
 
         self.send_btn = tk.Button(self.input_frame, text="Ask Nexus", command=self.ask_question)
         self.send_btn.pack(side=tk.LEFT)
+
+        self.cancel_btn = tk.Button(self.input_frame, text="Cancel", command=self.cancel_question, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=(5, 0))
+        self._answer_queue = None
+        self._cancel_event = None
+        self._answer_parts = []
+        self._answer_turn = None
+        # Per-question report from the engine (matched entities, saved
+        # message ids); filled by the answer worker.
+        self._answer_report = {}
+        # [mark, id of the turn's newest saved message or None] per turn,
+        # oldest first. Load Earlier fetches this session's messages with ids
+        # below _load_before; None means nothing earlier is hidden.
+        self._turns = deque()
+        self._turn_seq = 0
+        self._load_before = None
         self.right_frame = tk.Frame(self.paned, bg="white")
         self.paned.add(self.right_frame)
-        self.visualizer = GraphVisualizer(self.right_frame)
         self.session_id = str(uuid.uuid4())
-        api_key = os.getenv("GENAI_API_KEY")
-        self.engine = processor.HiveProcessor(util.HiveMind(api_key))
+        # The window comes up before the heavy parts exist: matplotlib,
+        # chromadb and google.genai are imported and the engine built on a
+        # worker thread. Buttons that need the engine stay disabled until
+        # engine_ready is set.
+        self.visualizer = None
+        self.engine = None
+        self.engine_ready = threading.Event()
+        # Ingest writes take the write side batch by batch and questions hold
+        # the read side while their prompt is built, as in cli.HiveService,
+        # so retrieval never walks the graph while the writer changes it.
+        self.engine_lock = util.RWLock()
+        # Uploads still running, and whether New Session or Resume is
+        # swapping the collection and graph on a worker thread.
+        self._ingests = 0
+        self._switching = False
+        self._engine_buttons = (self.upload_btn, self.new_session_btn, self.history_btn, self.send_btn)
+        for btn in self._engine_buttons:
+            btn.config(state=tk.DISABLED)
+        self._append_system("System: Loading engine...\n")
+        threading.Thread(target=self._load_engine, args=(self.session_id,), daemon=True).start()
+
+    def _load_engine(self, session_id):
+        try:
+            from visualizer import GraphVisualizer
+            self.root.after(0, self._on_visualizer_loaded, GraphVisualizer)
+            import processor
+            engine = processor.HiveProcessor(util.HiveMind(os.getenv("GENAI_API_KEY")))
+            engine.bind_session(session_id)
+        except Exception as e:
+            print(f"Engine error:{e}")
+            self.root.after(0, self._on_engine_failed, e)
+            return
+        self.root.after(0, self._on_engine_ready, engine)
+
+    def _on_visualizer_loaded(self, visualizer_cls):
+        self.visualizer = visualizer_cls(self.right_frame)
+
+    def _on_engine_ready(self, engine):
+        self.engine = engine
+        self.engine_ready.set()
+        self._refresh_buttons()
+        self._append_system("System: Ready.\n")
+
+    def _on_engine_failed(self, error):
+        self._append_system(f"System: Engine failed to start: {error}\n")
+        messagebox.showerror("Startup Error", f"Could not start the engine: {error}")
 
 
     def upload_files(self):
+        if self._switching:
+            return
         files = filedialog.askopenfilenames(filetypes=[("PDF files", "*.pdf")])
         if files:
             messagebox.showinfo("Success", f"Loaded {len(files)} papers. Starting Graph Indexing...")
+            self._ingests += 1
+            self._refresh_buttons()
 
             def worker(file_list):
-                for f in file_list:
-                    try:
-                        self.root.after(0, lambda f=f: self.chat_history.insert(tk.END, f"System: Indexing {os.path.basename(f)}...\n"))
-                        self.engine.process_pdf(f)
-                        #update and refresh
-                        self.root.after(0, lambda f=f: self.chat_history.insert(tk.END, f"Indexed: {os.path.basename(f)}\n"))
-                        self.root.after(0, lambda: self.visualizer.update_graph(self.engine.graph))
-                    except Exception as e:
-                        self.root.after(0, lambda f=f, e=e: messagebox.showerror("Processing Error", f"Could not process {f}: {e}"))
-                self.root.after(0, lambda: messagebox.showinfo("Done", f"Processed {len(file_list)} files."))
+                try:
+                    pipeline = IngestPipeline(
+                        self.engine,
+                        write_lock=self.engine_lock.writer,
+                        on_progress=lambda event: self.root.after(0, self._on_ingest_progress, event),
+                    )
+                    stats = pipeline.run(file_list)
+                except Exception as e:
+                    print(f"Ingest error:{e}")
+                    self.root.after(0, self._on_ingest_done, None, len(file_list))
+                    return
+                self.root.after(0, self._on_ingest_done, stats, len(file_list))
 
             t = threading.Thread(target=worker, args=(files,), daemon=True)
             t.start()
 
+    def _on_ingest_done(self, stats, requested):
+        self._ingests -= 1
+        self._refresh_buttons()
+        if stats is None:
+            messagebox.showerror("Processing Error", "Indexing stopped unexpectedly; see the console for details.")
+            return
+        messagebox.showinfo(
+            "Done",
+            f"Processed {stats['files']} of {requested} files "
+            f"({stats['chunks']} chunks in {stats['elapsed']:.1f}s)."
+        )
+
+    def _on_ingest_progress(self, event):
+        name = os.path.basename(event["file"])
+        progress = f"[{event['done']}/{event['total']}]"
+        if event["status"] == "extracted":
+            self._append_system(f"System: Indexing {name} ({event['chunks']} chunks)...\n")
+        elif event["status"] == "indexed":
+            self._append_system(f"Indexed: {name} {progress} - {event['chunks_per_sec']:.1f} chunks/s\n")
+            self.visualizer.update_graph(self.engine.graph)
+        elif event["status"] == "error":
+            self._append_system(f"System: Failed {name} {progress}\n")
+            messagebox.showerror("Processing Error", f"Could not process {event['file']}: {event['error']}")
+
     def ask_question(self):
         query = self.query_entry.get()
-        if not query:
+        if not query or self._answer_queue is not None or self._switching or not self.engine_ready.is_set():
             return
+        self._answer_turn = self._start_turn()
         self.chat_history.insert(tk.END, f"\nUser: {query}\n", "user_tag")
-
-        
-        answer = self.engine.query_nexus(query, session_id=self.session_id)
-
-        
         self.chat_history.insert(tk.END, "Nexus: ", 'nexus_tag')
-        self._insert_markdown(answer)
+        # Streamed tokens are shown raw between these marks and re-rendered
+        # as markdown once the answer is complete; system notes arriving in
+        # the meantime go after answer_end and are left alone.
+        self.chat_history.mark_set("answer_start", "end-1c")
+        self.chat_history.mark_gravity("answer_start", tk.LEFT)
         self.chat_history.insert(tk.END, "\n")
+        self.chat_history.mark_set("answer_end", "answer_start")
+        self.chat_history.mark_gravity("answer_end", tk.RIGHT)
         self.query_entry.delete(0, tk.END)
+        self.chat_history.see(tk.END)
+
+        self._answer_queue = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._answer_parts = []
+        self._answer_report = {}
+        self._refresh_buttons()
+
+        def worker(answers, cancel_event, session_id, report):
+            # The finished answer is parsed into tagged spans here, so the
+            # UI thread only does one insert.
+            parts = []
+            try:
+                stream = self.engine.query_nexus_stream(
+                    query, session_id=session_id, cancel_event=cancel_event, read_lock=self.engine_lock.reader,
+                    report=report,
+                )
+                for text in stream:
+                    parts.append(text)
+                    answers.put(("token", text))
+                kind = "done"
+                suffix = " [cancelled]" if cancel_event.is_set() else ""
+            except Exception as e:
+                # A failure mid-answer is marked so the partial text does not
+                # pass for a finished answer.
+                kind = "error"
+                suffix = f" [error: {e}]" if parts else f"[error: {e}]"
+            answer = "".join(parts)
+            saved = report.get("message_ids") if answer else None
+            answers.put((kind, (render_markdown(answer + suffix), saved[1] if saved else None)))
+
+        threading.Thread(
+            target=worker,
+            args=(self._answer_queue, self._cancel_event, self.session_id, self._answer_report),
+            daemon=True,
+        ).start()
+        self.root.after(30, self._drain_answer)
+
+    def _refresh_buttons(self):
+        # While an answer streams, New Session, View History and Load Earlier
+        # are disabled: they would swap the session or collection under the
+        # worker and move the marks its tokens are written after. New Session
+        # also waits for uploads, which write into the current collection,
+        # and nothing that touches the engine runs while a session switch is
+        # swapping it.
+        if not self.engine_ready.is_set():
+            return
+        answering = self._answer_queue is not None
+
+        def state(disabled):
+            return tk.DISABLED if disabled else tk.NORMAL
+
+        self.send_btn.config(state=state(answering or self._switching))
+        self.history_btn.config(state=state(answering or self._switching))
+        self.new_session_btn.config(state=state(answering or self._switching or self._ingests))
+        self.upload_btn.config(state=state(self._switching))
+        self.cancel_btn.config(state=state(not answering))
+        self._update_load_button()
+
+    def cancel_question(self):
+        # The turn is finished with the text shown so far instead of waiting
+        # for the worker, which only sees the event between tokens and may
+        # be stuck on a stalled model. Tokens arriving later are dropped;
+        # whichever final message reaches the queue first wins.
+        if self._cancel_event is None or self._cancel_event.is_set():
+            return
+        finished = self._take_tokens()
+        self._cancel_event.set()
+        if finished is not None:
+            self._answer_queue.put(finished)
+            return
+        answers = self._answer_queue
+        text = "".join(self._answer_parts)
+        threading.Thread(
+            target=lambda: answers.put(("done", (render_markdown(text + " [cancelled]"), None))),
+            daemon=True,
+        ).start()
+
+    def _take_tokens(self):
+        # Shows the tokens queued so far; returns the final message if one
+        # was queued behind them.
+        answers = self._answer_queue
+        tokens = []
+        finished = None
+        try:
+            while True:
+                kind, payload = answers.get_nowait()
+                if kind == "token":
+                    tokens.append(payload)
+                else:
+                    finished = (kind, payload)
+                    break
+        except queue.Empty:
+            pass
+        if tokens and not self._cancel_event.is_set():
+            self._answer_parts.extend(tokens)
+            self.chat_history.insert("answer_end", "".join(tokens))
+        return finished
+
+    def _drain_answer(self):
+        finished = self._take_tokens()
+        self.chat_history.see(tk.END)
+
+        if finished is None:
+            self.root.after(30, self._drain_answer)
+            return
+
+        _, (spans, saved_id) = finished
+        self.chat_history.delete("answer_start", "answer_end")
+        self.chat_history.insert("answer_start", *insert_args(spans))
         self.chat_history.see(tk.END) # Auto-scroll
+        self._answer_turn[1] = saved_id
+
+        self._answer_queue = None
+        self._cancel_event = None
+        self._answer_parts = []
+        self._answer_turn = None
+        self._refresh_buttons()
+        self.visualizer.update_graph(self.engine.graph, focus=self._answer_report.get("entities", []))
+
+    def _start_turn(self, last_id=None):
+        # Every turn starts at its own mark so whole turns can be trimmed
+        # from the top of the widget.
+        self._trim_chat(MAX_CHAT_TURNS - 1)
+        self._turn_seq += 1
+        mark = f"turn{self._turn_seq}"
+        self.chat_history.mark_set(mark, "end-1c")
+        self.chat_history.mark_gravity(mark, tk.LEFT)
+        turn = [mark, last_id]
+        self._turns.append(turn)
+        return turn
+
+    def _append_system(self, text):
+        self._start_turn()
+        self.chat_history.insert(tk.END, text)
+        self.chat_history.see(tk.END)
+
+    def _trim_chat(self, keep):
+        # Never trims the turn of an answer still streaming (or anything
+        # after it); the buffer catches up on the next turn instead.
+        removed = []
+        while len(self._turns) > keep and self._turns[0] is not self._answer_turn:
+            removed.append(self._turns.popleft())
+        if not removed:
+            return
+        self.chat_history.delete("1.0", self._turns[0][0] if self._turns else "end-1c")
+        for mark, last_id in removed:
+            self.chat_history.mark_unset(mark)
+            # Removed turns are the oldest, so everything up to the newest
+            # saved message among them is now hidden.
+            if last_id is not None:
+                self._load_before = last_id + 1
+        self._update_load_button()
+
+    def _clear_chat(self):
+        self.chat_history.delete("1.0", tk.END)
+        for mark, _ in self._turns:
+            self.chat_history.mark_unset(mark)
+        self._turns.clear()
+        self._load_before = None
+        self._update_load_button()
+
+    def _prepend_turns(self, blocks):
+        # blocks are [(spans, message id)], oldest first; they go above the current
+        # first turn in a single insert and each gets its own turn mark.
+        first = self._turns[0][0] if self._turns else None
+        if first is not None:
+            self.chat_history.mark_gravity(first, tk.RIGHT)
+        args = []
+        offsets = []
+        offset = 0
+        for spans, _ in blocks:
+            offsets.append(offset)
+            args.extend(insert_args(spans))
+            offset += span_length(spans)
+        if args:
+            self.chat_history.insert("1.0", *args)
+        if first is not None:
+            self.chat_history.mark_gravity(first, tk.LEFT)
+        new_turns = []
+        for (_, msg_id), start in zip(blocks, offsets):
+            self._turn_seq += 1
+            mark = f"turn{self._turn_seq}"
+            self.chat_history.mark_set(mark, f"1.0 + {start} chars")
+            self.chat_history.mark_gravity(mark, tk.LEFT)
+            new_turns.append([mark, msg_id])
+        self._turns.extendleft(reversed(new_turns))
+
+    def _update_load_button(self):
+        busy = self._answer_queue is not None or self._switching
+        self.load_earlier_btn.config(state=tk.NORMAL if self._load_before is not None and not busy else tk.DISABLED)
+
+    def load_earlier(self):
+        # Reloads the page of this session's messages just before the oldest
+        # one hidden so far, parsed off the UI thread.
+        if self._load_before is None or self._answer_queue is not None or self._switching:
+            return
+        session_id = self.session_id
+        before_id = self._load_before
+        self.load_earlier_btn.config(state=tk.DISABLED)
+
+        def worker():
+            try:
+                rows = self.engine.get_messages_page(session_id, before_id=before_id, limit=LOAD_EARLIER_ROWS)
+            except Exception as e:
+                print(f"Load earlier error:{e}")
+                rows = []
+            blocks = [(_message_spans(role, content), msg_id) for msg_id, role, content, _ in rows]
+            self.root.after(0, self._apply_earlier, session_id, before_id, blocks, len(rows) == LOAD_EARLIER_ROWS)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _apply_earlier(self, session_id, before_id, blocks, more):
+        # Dropped if the session changed, an answer started, or trimming moved
+        # the boundary in the meantime.
+        if session_id != self.session_id or self._answer_queue is not None or before_id != self._load_before:
+            self._update_load_button()
+            return
+        self._prepend_turns(blocks)
+        self._load_before = blocks[0][1] if blocks and more else None
+        self.chat_history.see("1.0")
+        self._update_load_button()
 
     def new_session(self):
-        self.session_id = str(uuid.uuid4())
-        self.chat_history.delete("1.0", tk.END)
-        self.chat_history.insert(tk.END, f"System: Started new session {self.session_id[:8]}\n")
-        if hasattr(self.engine, "reset_graph"):
-            self.engine.reset_graph()
-        if hasattr(self.engine, "reset_vector_index"):
-            self.engine.reset_vector_index()
-        self.visualizer.update_graph(self.engine.graph)
+        if self._answer_queue is not None or self._ingests or self._switching:
+            return
+        session_id = self.session_id = str(uuid.uuid4())
+        self._clear_chat()
+        self._set_switching(True)
+
+        def worker():
+            # The swap takes the write side of the engine lock, so it never
+            # runs under a question's retrieval.
+            try:
+                with self.engine_lock.writer:
+                    if hasattr(self.engine, "reset_graph"):
+                        self.engine.reset_graph()
+                    if hasattr(self.engine, "reset_vector_index"):
+                        self.engine.reset_vector_index(session_id=session_id)
+                note = f"System: Started new session {session_id[:8]}\n"
+            except Exception as e:
+                print(f"Session error:{e}")
+                note = f"System: Could not start a new session: {e}\n"
+            self.root.after(0, self._apply_transcript, [], None, note)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _set_switching(self, switching):
+        self._switching = switching
+        self._refresh_buttons()
 
     def show_history(self):
-        sessions = self.engine.list_sessions(limit=100)
-        if not sessions:
+        # Sessions and transcripts are fetched a page at a time as the user
+        # scrolls; the search box queries the full-text index and opens the
+        # transcript at the matching message.
+        first_page = self.engine.list_sessions(limit=HISTORY_PAGE)
+        if not first_page:
             messagebox.showinfo("History", "No past sessions found.")
             return
 
@@ -124,85 +478,217 @@ class NexusApp:
         right = tk.Frame(win)
         right.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
 
+        search_frame = tk.Frame(left)
+        search_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        search_entry = tk.Entry(search_frame)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
         listbox = tk.Listbox(left, width=40)
         listbox.pack(side=tk.TOP, fill=tk.Y, expand=True)
 
         transcript = tk.Text(right, wrap=tk.WORD)
         transcript.pack(fill=tk.BOTH, expand=True)
-
-        for idx, s in enumerate(sessions):
-            sid = s["session_id"]
-            start = s["start_at"] or ""
-            end = s["end_at"] or ""
-            count = s["count"]
-            label = f"{idx+1}. {sid[:8]}... ({count} messages)"\
-                    f"\n   {start} -> {end}"
-            listbox.insert(tk.END, label)
-
-        def on_select(event):
-            selection = listbox.curselection()
-            if not selection:
+        transcript.tag_configure('match', background='#fff3a8')
+
+        # rows[i] is the session id (and matched message id, if any) behind
+        # listbox line i; cursor is None once the last page is loaded.
+        state = {"rows": [], "cursor": None, "search": None, "offset": 0,
+                 "session": None, "first_id": None, "last_id": None,
+                 "more_before": False, "more_after": False, "loading": False}
+
+        def add_sessions(page):
+            for s in page:
+                start = s["start_at"] or ""
+                end = s["end_at"] or ""
+                label = f"{len(state['rows'])+1}. {s['session_id'][:8]}... ({s['count']} messages)"\
+                        f"\n   {start} -> {end}"
+                listbox.insert(tk.END, label)
+                state["rows"].append((s["session_id"], None))
+            last = page[-1] if len(page) == HISTORY_PAGE else None
+            state["cursor"] = (last["end_at"], last["session_id"]) if last else None
+
+        def add_results(results):
+            for r in results:
+                listbox.insert(tk.END, f"{r['session_id'][:8]} {r['role']}: {r['snippet']}")
+                state["rows"].append((r["session_id"], r["id"]))
+            state["offset"] += len(results)
+            state["cursor"] = state["offset"] if len(results) == HISTORY_PAGE else None
+
+        def load_more_rows():
+            if state["cursor"] is None:
                 return
-            i = selection[0]
-            s = sessions[i]
-            msgs = self.engine.get_session_messages(s["session_id"])
+            if state["search"]:
+                add_results(self.engine.search_messages(state["search"], limit=HISTORY_PAGE, offset=state["cursor"]))
+            else:
+                add_sessions(self.engine.list_sessions(limit=HISTORY_PAGE, before=state["cursor"]))
+
+        def reset_list():
+            listbox.delete(0, tk.END)
+            state["rows"] = []
+            state["offset"] = 0
+            state["cursor"] = None
+
+        def run_search(event=None):
+            text = search_entry.get().strip()
+            reset_list()
+            state["search"] = text or None
+            if text:
+                results = self.engine.search_messages(text, limit=HISTORY_PAGE)
+                if not results:
+                    listbox.insert(tk.END, "No matches.")
+                    state["rows"].append((None, None))
+                add_results(results)
+            else:
+                add_sessions(self.engine.list_sessions(limit=HISTORY_PAGE))
+
+        tk.Button(search_frame, text="Search", command=run_search).pack(side=tk.LEFT, padx=(5, 0))
+        search_entry.bind("<Return>", run_search)
+
+        def on_list_scroll(first, last):
+            if float(last) >= 0.95 and state["cursor"] is not None:
+                load_more_rows()
+
+        listbox.config(yscrollcommand=on_list_scroll)
+
+        def insert_messages(rows, at_top=False):
+            # A page goes in with one insert; each message starts at a mark
+            # named after its id, so a search hit can be scrolled to.
+            parts = [(msg_id, f"[{created_at}] {role.capitalize()}:\n{content}\n\n")
+                     for msg_id, role, content, created_at in rows]
+            text = "".join(part for _, part in parts)
+            if at_top:
+                first = f"msg{state['first_id']}"
+                transcript.mark_gravity(first, tk.RIGHT)
+                transcript.insert("1.0", text)
+                transcript.mark_gravity(first, tk.LEFT)
+                base = "1.0"
+            else:
+                base = transcript.index("end-1c")
+                transcript.insert(tk.END, text)
+            offset = 0
+            for msg_id, part in parts:
+                transcript.mark_set(f"msg{msg_id}", f"{base} + {offset} chars")
+                transcript.mark_gravity(f"msg{msg_id}", tk.LEFT)
+                offset += len(part)
+
+        def open_transcript(session_id, match_id=None):
+            state["loading"] = True
             transcript.delete("1.0", tk.END)
-            for role, content, created_at in msgs:
-                header = f"[{created_at}] {role.capitalize()}:\n"
-                transcript.insert(tk.END, header)
-                transcript.insert(tk.END, content + "\n\n")
+            for mark in transcript.mark_names():
+                if mark.startswith("msg"):
+                    transcript.mark_unset(mark)
+            after_id = match_id - 1 if match_id is not None else None
+            rows = self.engine.get_messages_page(session_id, after_id=after_id, limit=HISTORY_PAGE)
+            state.update(session=session_id, first_id=rows[0][0] if rows else None,
+                         last_id=rows[-1][0] if rows else None,
+                         more_before=match_id is not None, more_after=len(rows) == HISTORY_PAGE)
+            insert_messages(rows)
+            if match_id is not None and rows:
+                end = f"msg{rows[1][0]}" if len(rows) > 1 else tk.END
+                transcript.tag_add('match', f"msg{match_id}", end)
+                transcript.see(f"msg{match_id}")
+            state["loading"] = False
+
+        def on_transcript_scroll(first, last):
+            if state["loading"] or state["session"] is None:
+                return
+            state["loading"] = True
+            try:
+                if float(last) >= 0.95 and state["more_after"]:
+                    rows = self.engine.get_messages_page(
+                        state["session"], after_id=state["last_id"], limit=HISTORY_PAGE
+                    )
+                    insert_messages(rows)
+                    if rows:
+                        state["last_id"] = rows[-1][0]
+                    state["more_after"] = len(rows) == HISTORY_PAGE
+                elif float(first) <= 0.0 and state["more_before"]:
+                    rows = self.engine.get_messages_page(
+                        state["session"], before_id=state["first_id"], limit=HISTORY_PAGE
+                    )
+                    insert_messages(rows, at_top=True)
+                    if rows:
+                        transcript.yview(f"msg{state['first_id']}")
+                        state["first_id"] = rows[0][0]
+                    state["more_before"] = len(rows) == HISTORY_PAGE
+            finally:
+                state["loading"] = False
+
+        transcript.config(yscrollcommand=on_transcript_scroll)
+
+        def selected_session():
+            selection = listbox.curselection()
+            if not selection or selection[0] >= len(state["rows"]):
+                return None, None
+            return state["rows"][selection[0]]
+
+        def on_select(event):
+            session_id, match_id = selected_session()
+            if session_id is not None:
+                open_transcript(session_id, match_id)
 
         listbox.bind("<<ListboxSelect>>", on_select)
 
-    def _insert_markdown(self, md_text):
-        import re
-
-        
-        md_text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", md_text)
-
-        code_block = False
-        for line in md_text.splitlines():
-            if line.strip().startswith('```'):
-                code_block = not code_block
-                continue
-
-            if code_block:
-                self.chat_history.insert(tk.END, line + '\n', ('codeblock',))
-                continue
-
-            # Headings
-            m = re.match(r'^(#{1,6})\s+(.*)', line)
-            if m:
-                self.chat_history.insert(tk.END, m.group(2) + '\n', ('heading',))
-                continue
-
-            # Lists
-            m = re.match(r'^[\-\*\+]\s+(.*)', line)
-            if m:
-                self.chat_history.insert(tk.END, '• ')
-                line = m.group(1)
-
-            # Inline code
-            parts = re.split(r'(`[^`]+`)', line)
-            for part in parts:
-                if part.startswith('`') and part.endswith('`'):
-                    self.chat_history.insert(tk.END, part[1:-1], ('inline_code',))
-                    continue
-
-                # Bold
-                subparts = re.split(r'(\*\*[^*]+\*\*)', part)
-                for sp in subparts:
-                    if sp.startswith('**') and sp.endswith('**'):
-                        self.chat_history.insert(tk.END, sp[2:-2], ('bold',))
+        def resume():
+            session_id, _ = selected_session()
+            if session_id is None:
+                return
+            if self._answer_queue is not None:
+                messagebox.showinfo("History", "Wait for the current answer to finish or cancel it first.", parent=win)
+                return
+            if self._ingests or self._switching:
+                messagebox.showinfo("History", "Wait for the upload to finish first.", parent=win)
+                return
+            self.resume_session(session_id)
+            win.destroy()
+
+        tk.Button(left, text="Resume Session", command=resume).pack(side=tk.TOP, fill=tk.X, pady=(5, 0))
+
+        add_sessions(first_page)
+
+    def resume_session(self, session_id):
+        # Continues a past session with the document index and graph it used.
+        # The collection and graph are swapped on a worker thread under the
+        # write side of the engine lock, as in new_session.
+        self.session_id = session_id
+        self._clear_chat()
+        self._set_switching(True)
+
+        def worker():
+            try:
+                with self.engine_lock.writer:
+                    if self.engine.resume_session(session_id):
+                        note = (f"System: Resumed session {session_id[:8]} "
+                                f"with collection {self.engine.collection.name}\n")
                     else:
-                        # Italic
-                        subsub = re.split(r'(\*[^*]+\*)', sp)
-                        for ssp in subsub:
-                            if ssp.startswith('*') and ssp.endswith('*'):
-                                self.chat_history.insert(tk.END, ssp[1:-1], ('italic',))
-                            else:
-                                self.chat_history.insert(tk.END, ssp)
-            self.chat_history.insert(tk.END, '\n')
+                        self.engine.bind_session(session_id)
+                        note = (f"System: Resumed session {session_id[:8]}; "
+                                f"its document index is gone, upload documents again\n")
+            except Exception as e:
+                print(f"Session error:{e}")
+                note = f"System: Could not resume session {session_id[:8]}: {e}\n"
+            # Only the newest messages that fit the buffer are read; the rest
+            # stay behind Load Earlier.
+            limit = MAX_CHAT_TURNS - 1
+            try:
+                rows = self.engine.get_last_messages(session_id, limit=limit)
+            except Exception as e:
+                print(f"Transcript error:{e}")
+                rows = []
+            blocks = [(_message_spans(role, content), msg_id) for msg_id, role, content, _ in rows]
+            load_before = rows[0][0] if len(rows) == limit else None
+            self.root.after(0, self._apply_transcript, blocks, load_before, note)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _apply_transcript(self, blocks, load_before, note):
+        # Ends a session switch: new_session and resume_session block every
+        # other switch until this runs, so the session cannot have changed.
+        self.visualizer.update_graph(self.engine.graph, focus=[])
+        self._prepend_turns(blocks)
+        self._load_before = load_before
+        self._append_system(note)
+        self._set_switching(False)
 
 if __name__ == "__main__":
     root = tk.Tk()
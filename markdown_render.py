@@ -0,0 +1,77 @@
+import re
+
+
+# Compiled once at import; render_markdown runs on worker threads and only
+# the resulting spans touch the Tk widget.
+_LINK = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)")
+_LIST_ITEM = re.compile(r"^[\-\*\+]\s+(.*)")
+_INLINE_CODE = re.compile(r"(`[^`]+`)")
+_BOLD = re.compile(r"(\*\*[^*]+\*\*)")
+_ITALIC = re.compile(r"(\*[^*]+\*)")
+
+
+def render_markdown(md_text):
+    # Returns [(text, tags)] for the small markdown subset the chat panel
+    # understands: code fences, headings, bullets, inline code, bold, italic
+    # and links (shown as their label). Adjacent spans with the same tags
+    # are merged.
+    runs = []
+
+    def add(text, tags=()):
+        if not text:
+            return
+        if runs and runs[-1][0] == tags:
+            runs[-1][1].append(text)
+        else:
+            runs.append((tags, [text]))
+
+    md_text = _LINK.sub(r"\1", md_text)
+    code_block = False
+    for line in md_text.splitlines():
+        if line.strip().startswith("```"):
+            code_block = not code_block
+            continue
+        if code_block:
+            add(line + "\n", ("codeblock",))
+            continue
+
+        m = _HEADING.match(line)
+        if m:
+            add(m.group(2) + "\n", ("heading",))
+            continue
+
+        m = _LIST_ITEM.match(line)
+        if m:
+            add("• ")
+            line = m.group(1)
+
+        for part in _INLINE_CODE.split(line):
+            if part.startswith("`") and part.endswith("`") and len(part) > 1:
+                add(part[1:-1], ("inline_code",))
+                continue
+            for sp in _BOLD.split(part):
+                if sp.startswith("**") and sp.endswith("**") and len(sp) > 3:
+                    add(sp[2:-2], ("bold",))
+                    continue
+                for ssp in _ITALIC.split(sp):
+                    if ssp.startswith("*") and ssp.endswith("*") and len(ssp) > 1:
+                        add(ssp[1:-1], ("italic",))
+                    else:
+                        add(ssp)
+        add("\n")
+    return [("".join(parts), tags) for tags, parts in runs]
+
+
+def insert_args(spans):
+    # Flattens spans into the chars/tagList pairs Text.insert accepts, so a
+    # whole answer goes into the widget in one call.
+    args = []
+    for text, tags in spans:
+        args.append(text)
+        args.append(tags)
+    return args
+
+
+def span_length(spans):
+    return sum(len(text) for text, _ in spans)
@@ -0,0 +1,91 @@
+from collections import deque
+
+
+def normalize(name):
+    return name.lower()
+
+
+class EntityMatcher:
+    # Aho-Corasick automaton over normalized graph node names. Names are
+    # inserted into the trie as the graph grows; failure links are rebuilt
+    # lazily on the next match after an insert, so a burst of additions
+    # during ingestion costs one rebuild. match() finds every name that
+    # occurs as a substring of the text in a single pass over it.
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._key = [None]
+        self._dict = [0]
+        self._names = {}
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name):
+        key = normalize(name)
+        if not key:
+            return
+        if key in self._names:
+            self._names[key][name] = None
+            return
+        self._names[key] = {name: None}
+
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._key.append(None)
+                self._dict.append(0)
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._key[node] = key
+        self._dirty = True
+
+    def _build(self):
+        # _dict[n] points to the nearest proper suffix state that ends a
+        # name, so matches are reported without walking every failure link.
+        q = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._dict[child] = 0
+            q.append(child)
+        while q:
+            node = q.popleft()
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                f = self._goto[f].get(ch, 0)
+                self._fail[child] = f
+                self._dict[child] = f if self._key[f] is not None else self._dict[f]
+                q.append(child)
+        self._dirty = False
+
+    def match(self, text):
+        if not self._names:
+            return []
+        if self._dirty:
+            self._build()
+
+        found = {}
+        node = 0
+        for ch in normalize(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            hit = node if self._key[node] is not None else self._dict[node]
+            while hit:
+                found.setdefault(self._key[hit], None)
+                hit = self._dict[hit]
+
+        matches = []
+        for key in found:
+            matches.extend(self._names[key])
+        return matches
@@ -0,0 +1,395 @@
+import contextlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from processor import EXTRACT_EVERY, EXTRACT_GROUP, iter_chunk_batches
+
+
+_DONE = object()
+# Files are put back at most this many times after a pool dies with no file
+# in progress to blame (e.g. a worker failing to start).
+_MAX_EXTRACT_RETRIES = 3
+# Write ends of the pipes of the pools running in this process. A forked
+# worker closes the ones that are not its own; otherwise another pipeline's
+# receiver would not see EOF until this worker exits.
+_pipe_senders = set()
+# Set in each extraction worker process by the pool initializer.
+_chunk_conn = None
+_send_lock = None
+_started = None
+
+
+def _init_extract_worker(conn, send_lock, started):
+    global _chunk_conn, _send_lock, _started
+    for other in list(_pipe_senders):
+        if other is not conn:
+            other.close()
+    _chunk_conn = conn
+    _send_lock = send_lock
+    _started = started
+
+
+def _send(message):
+    # Written synchronously (no feeder thread to lose it) and under a lock so
+    # workers' messages never interleave in the pipe.
+    with _send_lock:
+        _chunk_conn.send(message)
+
+
+def _stream_chunks(path, chunk_size, overlap, batch_size, slot):
+    # Runs in a worker process. Flags `slot` in shared memory once it picks
+    # the file up, sends ("chunks", path, (start, batch)) per batch and
+    # returns the number of chunks; the pipe blocks the worker while the
+    # pipeline is behind. The return value is what marks the document done.
+    _started[slot] = 1
+    total = 0
+    for start, batch in iter_chunk_batches(path, chunk_size, overlap, batch_size):
+        _send(("chunks", path, (start, batch)))
+        total = start + len(batch)
+    return total
+
+
+def _receive(conn, inbox):
+    # Moves worker messages from the pipe to inbox, then puts _DONE at EOF:
+    # once every worker has exited and the parent's write end is closed. A
+    # message cut short by a worker dying mid-send ends the stream too.
+    try:
+        while True:
+            inbox.put(conn.recv())
+    except (EOFError, OSError):
+        pass
+    finally:
+        inbox.put(_DONE)
+
+
+class IngestPipeline:
+    # Staged ingestion: PDF text extraction in a process pool, LLM entity
+    # extraction in a bounded thread pool, and a single writer that owns the
+    # collection and graph. Bounded queues between the stages apply
+    # back-pressure instead of buffering whole corpora in memory.
+    # on_progress is called from the writer thread; UI callers must marshal
+    # it onto their own event loop. write_lock, when given, is held around
+    # every collection/graph write so concurrent readers see whole batches.
+
+    def __init__(self, engine, extract_workers=None, llm_workers=4, queue_size=8, on_progress=None,
+                 write_lock=None):
+        self.engine = engine
+        self.write_lock = write_lock if write_lock is not None else contextlib.nullcontext()
+        self.extract_workers = extract_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.llm_workers = max(1, int(llm_workers))
+        self.queue_size = max(1, int(queue_size))
+        self.on_progress = on_progress
+
+    def run(self, file_paths):
+        file_paths = list(file_paths)
+        text_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size * 4)
+
+        stages = [
+            threading.Thread(target=self._extract_stage, args=(file_paths, text_q), daemon=True),
+            threading.Thread(target=self._llm_stage, args=(text_q, write_q), daemon=True),
+        ]
+        for t in stages:
+            t.start()
+        stats = self._write_stage(len(file_paths), write_q)
+        for t in stages:
+            t.join()
+        return stats
+
+    def _extract_stage(self, file_paths, text_q):
+        # _DONE is always put, so the later stages finish even if extraction
+        # fails outright. forwarded (chunks already passed on per file) and
+        # retries outlive each pool, so a file retried on a fresh pool is not
+        # passed on twice or retried forever.
+        pending = deque(file_paths)
+        forwarded = {}
+        retries = {}
+        try:
+            while pending:
+                self._extract_with_pool(pending, text_q, forwarded, retries)
+        except Exception as e:
+            print(f"Extraction pool error: {e}")
+            while pending:
+                text_q.put(("error", pending.popleft(), e))
+        finally:
+            text_q.put(_DONE)
+
+    def _extract_with_pool(self, pending, text_q, forwarded, retries):
+        # Workers stream chunk batches through a pipe, which this thread
+        # forwards to text_q. A file is done when its future has returned a
+        # chunk count and that many chunks have been forwarded, failed when
+        # its future raises. A dead worker process (e.g. OOM-killed on a huge
+        # PDF) breaks the whole pool: files a worker had started and not
+        # finished are reported as failed, the rest go back on `pending` for
+        # the fresh pool the caller starts. Chunks a retried file has
+        # already passed on are skipped.
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        _pipe_senders.add(sender)
+        inbox = queue.Queue(maxsize=self.queue_size)
+        threading.Thread(target=_receive, args=(receiver, inbox), daemon=True).start()
+        # One start flag per submission, set in shared memory so it survives
+        # the worker dying straight after; a pool never takes more files than
+        # were pending when it was created.
+        started = multiprocessing.RawArray("b", len(pending))
+        in_flight = {}
+        # path -> submission slot, insertion-ordered so retried files keep
+        # their place.
+        open_paths = {}
+        totals = {}
+        submitted = 0
+
+        def forward(kind, path, payload):
+            # Late batches of a file that already failed are dropped.
+            if path not in open_paths:
+                return
+            start, batch = payload
+            skip = forwarded.get(path, 0) - start
+            if skip >= len(batch):
+                return
+            if skip > 0:
+                start, batch = start + skip, batch[skip:]
+            forwarded[path] = start + len(batch)
+            text_q.put((kind, path, (start, batch)))
+
+        def close_finished():
+            for path in [p for p in totals if forwarded.get(p, 0) >= totals[p]]:
+                del open_paths[path]
+                text_q.put(("end", path, totals.pop(path)))
+
+        pool = ProcessPoolExecutor(
+            max_workers=self.extract_workers,
+            initializer=_init_extract_worker,
+            initargs=(sender, multiprocessing.Lock(), started),
+        )
+        error = None
+        try:
+            while pending or open_paths:
+                while pending and len(open_paths) < self.queue_size:
+                    future = self._submit_extract(pool, pending[0], submitted)
+                    path = pending.popleft()
+                    in_flight[future] = path
+                    open_paths[path] = submitted
+                    submitted += 1
+                try:
+                    forward(*inbox.get(timeout=0.1))
+                except queue.Empty:
+                    pass
+                for future in [f for f in in_flight if f.done()]:
+                    path = in_flight.pop(future)
+                    exc = future.exception()
+                    if isinstance(exc, BrokenProcessPool):
+                        raise exc
+                    if path not in open_paths:
+                        continue
+                    if exc is not None:
+                        del open_paths[path]
+                        text_q.put(("error", path, exc))
+                    else:
+                        totals[path] = future.result()
+                close_finished()
+        except Exception as e:
+            error = e
+        finally:
+            # Workers exit after their current file (a broken pool's are
+            # already gone); the receiver sees EOF once they have and this
+            # end is closed, so everything they sent is forwarded first.
+            pool.shutdown(wait=False, cancel_futures=True)
+            _pipe_senders.discard(sender)
+            sender.close()
+            for message in iter(inbox.get, _DONE):
+                forward(*message)
+            receiver.close()
+        if error is None:
+            return
+
+        for future, path in in_flight.items():
+            if path in open_paths and future.done() and not future.cancelled() and future.exception() is None:
+                totals[path] = future.result()
+        close_finished()
+        # Files a worker had started and not finished were in flight when the
+        # pool died and fail with it. The rest (never picked up, or finished
+        # with only their last messages lost) go back to the front of
+        # `pending`.
+        broken = isinstance(error, BrokenProcessPool)
+        crashed = [p for p, slot in open_paths.items() if started[slot] and p not in totals]
+        retry = []
+        for path in open_paths:
+            if not broken or path in crashed:
+                text_q.put(("error", path, error))
+            elif crashed:
+                retry.append(path)
+            elif retries.get(path, 0) < _MAX_EXTRACT_RETRIES:
+                retries[path] = retries.get(path, 0) + 1
+                retry.append(path)
+            else:
+                text_q.put(("error", path, error))
+        if not broken or not submitted:
+            raise error
+        pending.extendleft(reversed(retry))
+
+    def _submit_extract(self, pool, path, slot):
+        return pool.submit(
+            _stream_chunks, path, self.engine.chunk_size, self.engine.chunk_overlap, self.engine.batch_size, slot
+        )
+
+    def _llm_stage(self, text_q, write_q):
+        # Chunk batches go straight on to the writer. Every EXTRACT_EVERY-th
+        # chunk of a file is collected and sent for LLM extraction in groups
+        # of EXTRACT_GROUP; a file's "extracted" message follows once it has
+        # ended and all its groups are done. The HiveMind client caps the
+        # number of API calls actually in flight.
+        slots = threading.BoundedSemaphore(self.llm_workers)
+        lock = threading.Lock()
+        files = {}
+
+        def close_job(path, ended=False):
+            with lock:
+                state = files[path]
+                if ended:
+                    state["ended"] = True
+                else:
+                    state["jobs"] -= 1
+                done = state["ended"] and not state["jobs"]
+                if done:
+                    del files[path]
+            if done and not state["failed"]:
+                write_q.put(("extracted", path, None))
+
+        def extract(path, sampled):
+            try:
+                for _, relations in self.engine._extract_relations_batch(sampled):
+                    write_q.put(("relations", path, relations))
+            except Exception as e:
+                # Fails the file like an unreadable PDF would, rather than
+                # indexing it without its graph edges.
+                print(f"Extraction error in {path}: {e}")
+                with lock:
+                    files[path]["failed"] = True
+                write_q.put(("error", path, e))
+            finally:
+                slots.release()
+                close_job(path)
+
+        def submit(path, sampled):
+            with lock:
+                files[path]["jobs"] += 1
+            slots.acquire()
+            llm.submit(extract, path, sampled)
+
+        with ThreadPoolExecutor(max_workers=self.llm_workers) as llm:
+            while True:
+                item = text_q.get()
+                if item is _DONE:
+                    break
+                kind, path, payload = item
+                state = files.get(path)
+                if state is None:
+                    state = files[path] = {"sampled": [], "jobs": 0, "ended": False, "failed": False}
+                write_q.put(item)
+                if kind == "chunks":
+                    if state["failed"]:
+                        continue
+                    start, chunks = payload
+                    for i, (text, _) in enumerate(chunks, start):
+                        if i % EXTRACT_EVERY == 0:
+                            state["sampled"].append(text)
+                            if len(state["sampled"]) >= EXTRACT_GROUP:
+                                submit(path, state["sampled"])
+                                state["sampled"] = []
+                    continue
+                if kind == "end" and state["sampled"] and not state["failed"]:
+                    submit(path, state["sampled"])
+                if kind == "error":
+                    state["failed"] = True
+                close_job(path, ended=True)
+        write_q.put((_DONE, None, None))
+
+    def _write_stage(self, total, write_q):
+        started = time.perf_counter()
+        files = {}
+        done_files = 0
+        failed_files = 0
+        chunk_count = 0
+
+        def report(path, status, error=None):
+            if self.on_progress is None:
+                return
+            elapsed = time.perf_counter() - started
+            state = files.get(path, {})
+            self.on_progress({
+                "file": path,
+                "status": status,
+                "error": error,
+                "chunks": state.get("chunks", 0),
+                "done": done_files + failed_files,
+                "total": total,
+                "elapsed": elapsed,
+                "files_per_sec": (done_files / elapsed) if elapsed > 0 else 0.0,
+                "chunks_per_sec": (chunk_count / elapsed) if elapsed > 0 else 0.0,
+            })
+
+        def maybe_finish(path):
+            nonlocal done_files
+            state = files[path]
+            if state["written"] and state["extracted"] and not state["finished"]:
+                state["finished"] = True
+                done_files += 1
+                # Node importance is refreshed here rather than on the next
+                # question, whenever the writer has caught up.
+                if write_q.empty():
+                    self.engine.refresh_rank(lock=self.write_lock)
+                report(path, "indexed")
+
+        while True:
+            kind, path, payload = write_q.get()
+            if kind is _DONE:
+                break
+            state = files.get(path)
+            if state is None:
+                state = files[path] = {"chunks": 0, "written": False, "extracted": False, "finished": False}
+            if state["finished"]:
+                # Messages for a file that already failed.
+                continue
+            if kind == "error":
+                state["finished"] = True
+                failed_files += 1
+                report(path, "error", payload)
+                continue
+            if kind == "chunks":
+                start, chunks = payload
+                try:
+                    with self.write_lock:
+                        self.engine.add_chunks(path, chunks, start=start)
+                except Exception as e:
+                    state["finished"] = True
+                    failed_files += 1
+                    report(path, "error", e)
+                    continue
+                state["chunks"] += len(chunks)
+                chunk_count += len(chunks)
+            elif kind == "end":
+                state["written"] = True
+                report(path, "extracted")
+            elif kind == "relations":
+                with self.write_lock:
+                    self.engine.parse_and_add_to_graph(payload)
+            elif kind == "extracted":
+                state["extracted"] = True
+            maybe_finish(path)
+
+        self.engine.refresh_rank(lock=self.write_lock)
+        elapsed = time.perf_counter() - started
+        return {
+            "files": done_files,
+            "failed": failed_files,
+            "chunks": chunk_count,
+            "elapsed": elapsed,
+            "files_per_sec": (done_files / elapsed) if elapsed > 0 else 0.0,
+            "chunks_per_sec": (chunk_count / elapsed) if elapsed > 0 else 0.0,
+        }
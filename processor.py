@@ -1,53 +1,413 @@
-import PyPDF2
-import networkx as nx
-import chromadb
-from chromadb.utils import embedding_functions
+import contextlib
 import json
+import os
+import re
+import sqlite3
+import time
 from pathlib import Path
 import uuid
-from util import ChatMemory
+from concurrent.futures import ThreadPoolExecutor
+from util import ChatMemory, CollectionRegistry, GraphStore
+from matcher import EntityMatcher
+import tracing
+from context import ContextPacker, trim_history
+from embeddings import CachedEmbedder, EmbeddingCache
+from answer_cache import AnswerCache, context_fingerprint
+from graphsearch import NodeRank, best_first_paths
+
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+EXTRACT_EVERY = 5
+EXTRACT_GROUP = 32
+NEIGHBOR_MEMO_SIZE = 10000
+GRAPH_HOPS = 2
+GRAPH_PATHS = 12
+GRAPH_EXPANSIONS = 200
+# Queries mark their collection as used at most this often (seconds).
+REGISTRY_TOUCH_INTERVAL = 60
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def iter_pages(file_path):
+    # Yields (page_number, text) one page at a time; only the current page's
+    # text is held in memory.
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(file_path)
+    for number, page in enumerate(reader.pages, start=1):
+        with tracing.span("ingest.extract_page"):
+            text = page.extract_text()
+        if text:
+            yield number, text
+
+
+def _split_sentences(text, limit):
+    for sentence in _SENTENCE_BREAK.split(text):
+        sentence = " ".join(sentence.split())
+        while len(sentence) > limit:
+            yield sentence[:limit]
+            sentence = sentence[limit:]
+        if sentence:
+            yield sentence
+
+
+def iter_chunks(pages, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    # Packs whole sentences into chunks of at most chunk_size characters.
+    # Each new chunk starts with the trailing sentences of the previous one
+    # (up to overlap characters). Yields (text, metadata) where metadata
+    # records the pages the chunk starts and ends on.
+    buf = []
+    size = 0
+    fresh = False
+    for page_number, text in pages:
+        for sentence in _split_sentences(text, chunk_size):
+            if buf and size + len(sentence) + 1 > chunk_size:
+                if fresh:
+                    yield _emit_chunk(buf)
+                    fresh = False
+                kept = []
+                kept_size = 0
+                for item in reversed(buf):
+                    if kept_size + len(item[0]) + 1 > overlap:
+                        break
+                    kept.insert(0, item)
+                    kept_size += len(item[0]) + 1
+                while kept and kept_size + len(sentence) + 1 > chunk_size:
+                    kept_size -= len(kept.pop(0)[0]) + 1
+                buf, size = kept, kept_size
+            buf.append((sentence, page_number))
+            size += len(sentence) + 1
+            fresh = True
+    if buf and fresh:
+        yield _emit_chunk(buf)
+
+
+def _emit_chunk(buf):
+    text = " ".join(sentence for sentence, _ in buf)
+    return text, {"page": buf[0][1], "page_end": buf[-1][1]}
+
+
+def iter_chunk_batches(file_path, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, batch_size=64):
+    # Yields (index of the first chunk, [(text, metadata)]) batches of a
+    # document as they are chunked, so callers never hold the whole document.
+    # Module-level so it can run inside a worker process.
+    with tracing.span("ingest.extract_text") as sp:
+        batch = []
+        start = 0
+        for chunk in iter_chunks(iter_pages(file_path), chunk_size, overlap):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield start, batch
+                start += len(batch)
+                batch = []
+        if batch:
+            yield start, batch
+            start += len(batch)
+        sp.set(chunks=start)
+
+
+def _result_hits(results):
+    # Flattens a Chroma query result into one [(id, document, distance)]
+    # list per query text.
+    if not results:
+        return []
+    ids = results.get("ids") or []
+    docs = results.get("documents") or []
+    distances = results.get("distances") or []
+    hits = []
+    for i, row_ids in enumerate(ids):
+        row_docs = docs[i] if i < len(docs) and docs[i] is not None else []
+        row_dist = distances[i] if i < len(distances) and distances[i] is not None else []
+        hits.append([
+            (chunk_id, doc, row_dist[j] if j < len(row_dist) else 0.0)
+            for j, (chunk_id, doc) in enumerate(zip(row_ids, row_docs))
+        ])
+    return hits
+
+
+def _default_data_dir(data_dir=None):
+    if data_dir is None:
+        data_dir = Path(__file__).resolve().parent / "Data"
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+def compact_collections(data_dir=None, keep_last=5, max_age_days=30, dry_run=False, protect=()):
+    # Drops collections that are unregistered (orphans), empty, or idle for
+    # longer than max_age_days, always keeping the names in protect and the
+    # keep_last most recently used. Their graphs and cached answers go with
+    # them, and the Chroma database is vacuumed to hand the space back. Only
+    # the stores are opened (no engine, model or new collection), so this is
+    # safe to run from the CLI.
+    import chromadb
+
+    data_dir = _default_data_dir(data_dir)
+    chroma_path = data_dir / "chroma"
+    return _compact(
+        chromadb.PersistentClient(path=str(chroma_path)),
+        chroma_path,
+        CollectionRegistry(data_dir / "nexus_history.db"),
+        GraphStore(data_dir / "nexus_graph.db"),
+        AnswerCache(data_dir / "answer_cache.db"),
+        keep_last=keep_last, max_age_days=max_age_days, dry_run=dry_run, protect=set(protect),
+    )
+
+
+def compact_history(data_dir=None):
+    # Drops stored context text no message refers to any more and vacuums
+    # the history database. Returns the number of blobs removed.
+    return ChatMemory(_default_data_dir(data_dir) / "nexus_history.db").compact()
+
+
+def _compact(chroma_client, chroma_path, registry, graph_store, answer_cache, keep_last, max_age_days, dry_run,
+             protect):
+    registered = {row["name"]: row for row in registry.list()}
+    existing = [c if isinstance(c, str) else c.name for c in chroma_client.list_collections()]
+    recent = sorted(registered.values(), key=lambda r: r["last_used_at"], reverse=True)
+    protected = set(protect) | {row["name"] for row in recent[:keep_last]}
+    cutoff = time.time() - max_age_days * 86400
+
+    doomed = {}
+    for name in existing:
+        row = registered.get(name)
+        if name in protected:
+            continue
+        if row is None:
+            doomed[name] = "orphaned"
+        elif row["doc_count"] == 0:
+            doomed[name] = "empty"
+        elif row["last_used_at"] < cutoff:
+            doomed[name] = "expired"
+    stale_rows = [name for name in registered if name not in existing]
+
+    if not dry_run:
+        for name in doomed:
+            try:
+                chroma_client.delete_collection(name=name)
+            except Exception as e:
+                print(f"Could not delete collection {name}: {e}")
+                continue
+            graph_store.drop(name)
+            answer_cache.drop(name)
+        registry.remove(list(doomed) + stale_rows)
+        if doomed:
+            _vacuum_chroma(chroma_path)
+
+    return {"dropped": doomed, "stale_registry_rows": stale_rows, "kept": sorted(set(existing) - set(doomed))}
+
+
+def _vacuum_chroma(chroma_path):
+    db = Path(chroma_path) / "chroma.sqlite3"
+    if not db.exists():
+        return
+    try:
+        conn = sqlite3.connect(str(db), timeout=5)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Chroma vacuum skipped: {e}")
 
 
 class HiveProcessor:
-    def __init__(self, HiveMind):
+    def __init__(self, HiveMind, batch_size=64, collection_name=None, data_dir=None, embedding_function=None,
+                 context_budget=3000, history_budget=600, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                 graph_hops=GRAPH_HOPS, graph_paths=GRAPH_PATHS, graph_expansions=GRAPH_EXPANSIONS,
+                 answer_threshold=0.95, use_answer_cache=None, context_snapshots=False):
         self.core = HiveMind
-        base_path = Path(__file__).resolve().parent
-        data_dir = base_path / "Data"
-        data_dir.mkdir(exist_ok=True)
+        self.batch_size = max(1, int(batch_size))
+        self.embedding_function = embedding_function
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.graph_hops = graph_hops
+        self.graph_paths = graph_paths
+        self.graph_expansions = graph_expansions
+        self.context_packer = ContextPacker(token_budget=context_budget, history_budget=history_budget)
+        # History stores chunk ids by default; snapshots also freeze the
+        # retrieved text (compressed, deduplicated) so it outlives the
+        # collection.
+        self.context_snapshots = context_snapshots
+        data_dir = _default_data_dir(data_dir)
         self.memory = ChatMemory(data_dir / "nexus_history.db")
-        self.chroma_client = chromadb.PersistentClient(path=str(data_dir / "chroma"))
-        self.collection = self._create_new_collection()
+        self.graph_store = GraphStore(data_dir / "nexus_graph.db")
+        self.registry = CollectionRegistry(data_dir / "nexus_history.db")
+        self._touched = {}
+        self.chroma_path = data_dir / "chroma"
+        self.session_id = None
+        # Vectors are computed (or fetched from the on-disk cache) here and
+        # handed to Chroma, so new collections reuse earlier embeddings.
+        self.embedder = CachedEmbedder(
+            embedding_function,
+            cache=EmbeddingCache(data_dir / "embedding_cache.db"),
+            batch_size=self.batch_size,
+        )
+        # Finished answers are reused for the same or a near-identical
+        # question over identical context; HIVEMIND_NO_CACHE=1 turns it off
+        # along with the LLM response cache.
+        if use_answer_cache is None:
+            use_answer_cache = os.getenv("HIVEMIND_NO_CACHE", "").strip().lower() not in ("1", "true", "yes")
+        self.use_answer_cache = use_answer_cache
+        self.answer_cache = AnswerCache(data_dir / "answer_cache.db", threshold=answer_threshold)
+        # chromadb and networkx are imported here rather than at module level
+        # so importing processor (the GUI, the CLI, pipeline workers) stays
+        # cheap; the GUI builds the processor on a background thread.
+        import chromadb
+        import networkx as nx
+
+        self.chroma_client = chromadb.PersistentClient(path=str(self.chroma_path))
         self.graph = nx.DiGraph()
+        self.entity_matcher = EntityMatcher()
+        self.node_rank = NodeRank()
+        self._graph_weight = 0
+        self._neighbor_memo = {}
+        if collection_name:
+            self.open_collection(collection_name)
+        else:
+            self.collection = self._create_new_collection()
 
     def _create_new_collection(self):
         name = f"research_papers_{uuid.uuid4().hex[:8]}"
-        return self.chroma_client.create_collection(name=name)
+        collection = self.chroma_client.create_collection(name=name, embedding_function=self.embedding_function)
+        self.registry.register(name, self.session_id)
+        return collection
+
+    def open_collection(self, name):
+        # Reopens an existing index together with the graph persisted for it.
+        self.collection = self.chroma_client.get_or_create_collection(
+            name=name, embedding_function=self.embedding_function
+        )
+        self.registry.register(name, self.session_id)
+        self._neighbor_memo = {}
+        self.load_graph()
+
+    def bind_session(self, session_id):
+        # Records the current collection as the index of session_id.
+        self.session_id = session_id
+        self.registry.register(self.collection.name, session_id)
+
+    def resume_session(self, session_id):
+        # Reopens the collection and graph a past session was using. Returns
+        # False (leaving the current index in place) if none is recorded or
+        # it has since been garbage-collected.
+        name = self.registry.collection_for_session(session_id)
+        if name is None:
+            return False
+        try:
+            self.chroma_client.get_collection(name=name)
+        except Exception:
+            self.registry.remove([name])
+            return False
+        self.session_id = session_id
+        self.open_collection(name)
+        return True
+
+    def compact_collections(self, keep_last=5, max_age_days=30, dry_run=False):
+        # Same as the module-level compact_collections, over this engine's
+        # stores and never dropping its current collection.
+        return _compact(
+            self.chroma_client, self.chroma_path, self.registry, self.graph_store, self.answer_cache,
+            keep_last=keep_last, max_age_days=max_age_days, dry_run=dry_run, protect={self.collection.name},
+        )
+
+    def load_graph(self):
+        self.reset_graph()
+        edges = self.graph_store.load_edges(self.collection.name)
+        for source, target, relation, weight in edges:
+            self._count_relation(source, target, relation, weight)
+        for node in self.graph.nodes:
+            self.entity_matcher.add(node)
+        self._graph_weight = sum(weight for _, _, _, weight in edges)
+        self.refresh_rank()
 
     def process_pdf(self, file_path):
-        reader = PyPDF2.PdfReader(file_path)
-        full_text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                full_text += page_text
+        # Chunks stream from the PDF page by page and are written in batches
+        # on the calling thread. Every EXTRACT_EVERY-th chunk is collected
+        # into groups that are extracted on a side thread; with at most one
+        # group in flight, peak memory stays bounded by the batch and group
+        # sizes rather than the document length.
+        with tracing.span("ingest.process_pdf", file=str(file_path)):
+            chunks = iter_chunks(iter_pages(file_path), self.chunk_size, self.chunk_overlap)
+            with ThreadPoolExecutor(max_workers=1) as extractor:
+                pending = None
+                for group in self._write_chunks(file_path, chunks, sample_group=EXTRACT_GROUP):
+                    if pending is not None:
+                        self._merge_relations(pending.result())
+                    pending = extractor.submit(self._extract_group, group)
+                if pending is not None:
+                    self._merge_relations(pending.result())
+            self.refresh_rank()
 
-        chunks = [full_text[i:i+1000] for i in range(0, len(full_text), 1000)]
+    def add_chunks(self, file_path, chunks, start=0):
+        # chunks may be plain strings or (text, metadata) pairs; start is the
+        # index of the first one when a document arrives in several batches.
+        for _ in self._write_chunks(file_path, chunks, start=start):
+            pass
 
-        for i, chunk in enumerate(chunks):
-            self.collection.add(
-                documents=[chunk],
-                metadatas=[{"source": file_path, "chunk_id": i}],
-                ids=[f"{file_path}_{i}"]
+    def _write_chunks(self, file_path, chunks, sample_group=None, start=0):
+        # Writes chunks in batches. With sample_group set, also yields the
+        # texts of every EXTRACT_EVERY-th chunk in groups of that size.
+        batch = []
+        sampled = []
+        for i, chunk in enumerate(chunks, start):
+            if isinstance(chunk, str):
+                text, meta = chunk, {}
+            else:
+                text, meta = chunk
+            batch.append((f"{file_path}_{i}", text, {"source": file_path, "chunk_id": i, **meta}))
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+            if sample_group and i % EXTRACT_EVERY == 0:
+                sampled.append(text)
+                if len(sampled) >= sample_group:
+                    yield sampled
+                    sampled = []
+        if batch:
+            self._write_batch(batch)
+        self.registry.touch(self.collection.name, self.collection.count())
+        if sampled:
+            yield sampled
+
+    def _extract_group(self, texts):
+        return [relations for _, relations in self._extract_relations_batch(texts)]
+
+    def _merge_relations(self, results):
+        for relations in results:
+            self.parse_and_add_to_graph(relations)
+
+    def _write_batch(self, batch):
+        # upsert keeps re-runs idempotent: ids already written by an
+        # interrupted ingest are overwritten instead of raising.
+        ids, documents, metadatas = zip(*batch)
+        embeddings = self.embedder.embed(documents)
+        with tracing.span("ingest.write_batch", chunks=len(batch)):
+            self.collection.upsert(
+                ids=list(ids),
+                documents=list(documents),
+                embeddings=embeddings,
+                metadatas=list(metadatas),
             )
+        self._neighbor_memo = {}
 
-            if i % 5 == 0:
-                if hasattr(self.core, 'extract_entities_and_relations'):
-                    relations = self.core.extract_entities_and_relations(chunk)
-                else:
-                    relations = ""
-                self.parse_and_add_to_graph(relations)
+    def _extract_relations(self, chunk):
+        if hasattr(self.core, 'extract_entities_and_relations'):
+            with tracing.span("ingest.extract_relations", chars=len(chunk)):
+                return self.core.extract_entities_and_relations(chunk)
+        return ""
+
+    def _extract_relations_batch(self, chunks):
+        if hasattr(self.core, 'extract_entities_batch'):
+            yield from self.core.extract_entities_batch(chunks)
+            return
+        for i, chunk in enumerate(chunks):
+            yield [i], self._extract_relations(chunk)
 
     def parse_and_add_to_graph(self, ai_output):
+        edges = []
         try:
             lines = ai_output.strip().split('\n')
             for line in lines:
@@ -55,39 +415,263 @@ class HiveProcessor:
                 parts = line.replace('(', '').replace(')', '').split(',')
                 if len(parts) == 3:
                     sub, rel, obj = [p.strip() for p in parts]
-                    self.graph.add_edge(sub, obj, relation=rel)
+                    self._count_relation(sub, obj, rel)
+                    self.entity_matcher.add(sub)
+                    self.entity_matcher.add(obj)
+                    edges.append((sub, obj, rel))
         except Exception as e:
             print(f"Graph error:{e}")
+        if edges:
+            self.node_rank.invalidate()
+            self._graph_weight += len(edges)
 
-    def query_nexus(self, user_query, session_id=None):
-        entry_entities = [node for node in self.graph.nodes if node.lower() in user_query.lower()]
-        extended_context = []
-        graph_connections = []
-        for entity in entry_entities:
-            for neighbor in self.graph.neighbors(entity):
-                relation = self.graph[entity][neighbor].get('relation', '')
-                graph_connections.append(f"({entity} --{relation}--> {neighbor})")
-                extended_context.append(f"Related: {entity} {relation} {neighbor}")
-
-                try:
-                    neighbor_results = self.collection.query(query_texts=[neighbor], n_results=1)
-                    docs = neighbor_results.get("documents") if neighbor_results else None
-                    if docs and len(docs) > 0:
-                        extended_context.extend(docs[0])
-                except Exception:
-                    pass
+        tracing.count("graph.edges_parsed", len(edges))
         try:
-            vector_results = self.collection.query(query_texts=[user_query], n_results=2)
-            docs = vector_results.get("documents") if vector_results else None
-            vector_docs = docs[0] if docs and len(docs) > 0 else []
+            with tracing.span("graph.persist", edges=len(edges)):
+                self.graph_store.add_edges(self.collection.name, edges)
+        except Exception as e:
+            print(f"Graph store error:{e}")
+
+    def refresh_rank(self, lock=None):
+        # Recomputes node importance after a batch of edge writes so the query
+        # path never has to. lock is the graph writers' lock; it is held only
+        # while the edges are snapshotted.
+        with tracing.span("graph.rank") as sp:
+            if self.node_rank.refresh(self.graph, lock=lock):
+                sp.set(iterations=self.node_rank.iterations)
+
+    def _count_relation(self, source, target, relation, n=1):
+        # An edge keeps a count per relation label in "relations"; "relation"
+        # is the most-extracted label (the first seen on ties) and "weight"
+        # the total count over all labels.
+        if not self.graph.has_edge(source, target):
+            self.graph.add_edge(source, target, relation=relation, relations={relation: n}, weight=n)
+            return
+        data = self.graph[source][target]
+        relations = data.setdefault("relations", {})
+        relations[relation] = relations.get(relation, 0) + n
+        data["weight"] = data.get("weight", 0) + n
+        data["relation"] = max(relations, key=relations.get)
+
+    def query_nexus(self, user_query, session_id=None, read_lock=None, report=None):
+        # read_lock, when given, is held only while the prompt is built from
+        # the collection and graph; the LLM call, caching and history writes
+        # run outside it, so a waiting ingest write is not stuck behind
+        # in-flight answers.
+        # report, when given, is a dict filled for this call only: the graph
+        # entities matched ("entities"), the packed context's token count,
+        # selected and dropped ids ("context"), whether the answer came from
+        # the answer cache ("cached") and the (question id, answer id) saved
+        # to history ("message_ids", None if nothing was saved).
+        report = self._new_report(report)
+        with tracing.span("query.total"):
+            with read_lock or contextlib.nullcontext():
+                final_prompt, full_context, kg_connections_text, context_ids, history_context = self._build_prompt(
+                    user_query, session_id, report
+                )
+                cache_key = self._answer_key(user_query, full_context, kg_connections_text, history_context)
+                self._mark_used()
+            answer_text = self._cached_answer(cache_key, report)
+            if answer_text is None:
+                answer_text = self._generate(final_prompt)
+                if answer_text is None:
+                    return "No model available to answer the query."
+                self._store_answer(cache_key, user_query, answer_text)
+
+            self._save_exchange(
+                session_id, user_query, answer_text, full_context, kg_connections_text, context_ids, report
+            )
+            return answer_text
+
+    def query_nexus_stream(self, user_query, session_id=None, cancel_event=None, read_lock=None, report=None):
+        # Yields answer text as it arrives. Setting cancel_event stops the
+        # stream; whatever was received so far is still saved to history.
+        # It is also checked before retrieval and before the model is
+        # called, so a question cancelled early costs no LLM call.
+        # read_lock and report are as in query_nexus; the lock is never held
+        # across a yield, and the report is complete once the stream ends.
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        report = self._new_report(report)
+        with tracing.span("query.total"):
+            if cancelled():
+                return
+            with read_lock or contextlib.nullcontext():
+                final_prompt, full_context, kg_connections_text, context_ids, history_context = self._build_prompt(
+                    user_query, session_id, report
+                )
+                cache_key = self._answer_key(user_query, full_context, kg_connections_text, history_context)
+                self._mark_used()
+            answer_text = self._cached_answer(cache_key, report)
+            if answer_text is not None:
+                yield answer_text
+                self._save_exchange(
+                    session_id, user_query, answer_text, full_context, kg_connections_text, context_ids, report
+                )
+                return
+            if cancelled():
+                return
+
+            streaming = hasattr(self.core, 'generate_content_stream')
+            if streaming:
+                tracing.count("query.prompt_chars", len(final_prompt))
+                stream = self.core.generate_content_stream(final_prompt)
+            else:
+                answer_text = self._generate(final_prompt)
+                if answer_text is None:
+                    yield "No model available to answer the query."
+                    return
+                stream = iter([answer_text])
+
+            parts = []
+            completed = False
+            # query.llm covers the streamed answer (the non-streaming
+            # fallback is timed inside _generate); first_token_ms is the
+            # wait before the first text arrives.
+            if streaming:
+                llm_span = tracing.span("query.llm", prompt_chars=len(final_prompt))
+            else:
+                llm_span = contextlib.nullcontext()
+            try:
+                with llm_span as sp:
+                    started = time.perf_counter()
+                    for text in stream:
+                        if cancelled():
+                            break
+                        if not parts and streaming:
+                            sp.set(first_token_ms=int((time.perf_counter() - started) * 1000))
+                        parts.append(text)
+                        yield text
+                    else:
+                        completed = True
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+                answer_text = "".join(parts)
+                if completed and answer_text:
+                    self._store_answer(cache_key, user_query, answer_text)
+                if answer_text:
+                    self._save_exchange(
+                        session_id, user_query, answer_text, full_context, kg_connections_text, context_ids, report
+                    )
+
+    def _mark_used(self):
+        # Questions count as use for retention (opening or resuming a
+        # collection registers it); the write is throttled so a burst of
+        # questions costs one update.
+        name = self.collection.name
+        now = time.time()
+        if now - self._touched.get(name, 0) < REGISTRY_TOUCH_INTERVAL:
+            return
+        self._touched[name] = now
+        try:
+            self.registry.touch(name)
+        except Exception as e:
+            print(f"Registry error:{e}")
+
+    @staticmethod
+    def _new_report(report):
+        if report is None:
+            report = {}
+        report.clear()
+        report.update(entities=[], context=None, cached=False, message_ids=None)
+        return report
+
+    def _answer_key(self, user_query, full_context, kg_connections_text, history_context):
+        # Scope and stamp tie an answer to the collection and to the exact
+        # state of its index and graph (counts persist, so they survive a
+        # restart); any new chunk or edge moves the stamp and retires the
+        # collection's older answers. The fingerprint covers everything else
+        # in the prompt, including the session's chat history, so a follow-up
+        # like "and then?" is only reused after the same conversation.
+        if not self.use_answer_cache:
+            return None
+        try:
+            vector = self.embedder.embed([user_query])[0]
+            stamp = f"{self.collection.count()}:{self.graph.number_of_edges()}:{self._graph_weight}"
         except Exception:
-            vector_docs = []
-        combined = list(set(extended_context + vector_docs))
-        full_context = "\n".join(combined)
+            return None
+        model = getattr(self.core, "model", "")
+        fingerprint = context_fingerprint(str(model), full_context, kg_connections_text, history_context)
+        return self.collection.name, stamp, fingerprint, vector
+
+    def _cached_answer(self, cache_key, report):
+        if cache_key is None:
+            return None
+        with tracing.span("query.answer_cache") as sp:
+            answer = self.answer_cache.get(*cache_key)
+            sp.set(hit=int(answer is not None))
+        report["cached"] = answer is not None
+        return answer
+
+    def _store_answer(self, cache_key, user_query, answer_text):
+        if cache_key is None:
+            return
+        scope, stamp, fingerprint, vector = cache_key
+        try:
+            self.answer_cache.put(scope, stamp, fingerprint, user_query, vector, answer_text)
+        except Exception as e:
+            print(f"Answer cache error:{e}")
+
+    def _generate(self, final_prompt):
+        response = None
+        tracing.count("query.prompt_chars", len(final_prompt))
+        with tracing.span("query.llm", prompt_chars=len(final_prompt)):
+            if hasattr(self.core, 'generate_content'):
+                response = self.core.generate_content(final_prompt)
+            elif hasattr(self.core, 'model') and hasattr(self.core.model, 'generate_content'):
+                response = self.core.model.generate_content(final_prompt)
+            else:
+                return None
+
+        if hasattr(response, 'text'):
+            return response.text
+        return str(response)
+
+    def _build_prompt(self, user_query, session_id, report):
+        with tracing.span("query.entity_match") as sp:
+            entry_entities = self.entity_matcher.match(user_query)
+            sp.set(entities=len(entry_entities))
+        report["entities"] = list(entry_entities)
+        candidates = []
+        graph_connections = []
+        neighbors = {}
+        with tracing.span("query.graph_expand") as sp:
+            paths = best_first_paths(
+                self.graph, entry_entities, self.node_rank,
+                max_hops=self.graph_hops, max_paths=self.graph_paths, max_expansions=self.graph_expansions,
+            )
+            # Scores are relative to the best path, which ranks like the
+            # flat one-hop relations used to (0.5).
+            top = paths[0][0] if paths else 1.0
+            for score, nodes, relations in paths:
+                weight = score / top
+                steps = [f"{a} {rel} {b}" for a, rel, b in zip(nodes, relations, nodes[1:])]
+                chain = "".join(f" --{rel}--> {b}" for rel, b in zip(relations, nodes[1:]))
+                graph_connections.append(f"({nodes[0]}{chain})")
+                candidates.append({
+                    "id": "rel:" + "|".join(f"{a}|{rel}" for a, rel in zip(nodes, relations)) + f"|{nodes[-1]}",
+                    "text": "Related: " + "; ".join(steps),
+                    "score": 0.5 * weight,
+                })
+                neighbors[nodes[-1]] = max(weight, neighbors.get(nodes[-1], 0.0))
+            sp.set(paths=len(paths), neighbors=len(neighbors))
+
+        candidates.extend(self._retrieve(user_query, neighbors))
+        with tracing.span("query.pack_context", candidates=len(candidates)) as sp:
+            packed = self.context_packer.pack(candidates)
+            sp.set(tokens=packed["tokens"], dropped=len(packed["dropped"]))
+        report["context"] = {key: packed[key] for key in ("tokens", "selected", "dropped")}
+        full_context = packed["text"]
 
         history_context = ""
         if session_id is not None:
-            history_context = self.memory.get_recent_context(session_id)
+            with tracing.span("query.history"):
+                history_context = trim_history(
+                    self.memory.get_recent_context(session_id), self.context_packer.history_budget
+                )
 
         kg_connections_text = "\n".join(graph_connections) if graph_connections else "No direct graph connections found."
 
@@ -109,36 +693,106 @@ class HiveProcessor:
         Instruction: If the graph shows a connection, mention it to show how concepts are linked.
         """
 
-        response = None
-        if hasattr(self.core, 'generate_content'):
-            response = self.core.generate_content(final_prompt)
-        elif hasattr(self.core, 'model') and hasattr(self.core.model, 'generate_content'):
-            response = self.core.model.generate_content(final_prompt)
-        else:
-            return "No model available to answer the query."
+        context_ids = [cid for cid in packed["selected"] if not cid.startswith("rel:")]
+        return final_prompt, full_context, kg_connections_text, context_ids, history_context
 
-        if hasattr(response, 'text'):
-            answer_text = response.text
-        else:
-            answer_text = str(response)
+    def _save_exchange(self, session_id, user_query, answer_text, full_context, kg_connections_text, context_ids,
+                       report):
+        if session_id is None:
+            return
+        user_context = {"collection": self.collection.name, "chunks": context_ids}
+        if self.context_snapshots:
+            user_context["snapshot"] = full_context
+        try:
+            report["message_ids"] = self.memory.add_exchange(
+                session_id,
+                user_query,
+                answer_text,
+                user_context=user_context,
+                assistant_context={"collection": self.collection.name, "graph": kg_connections_text},
+            )
+        except Exception:
+            pass
 
-        if session_id is not None:
-            try:
-                self.memory.add_message(session_id, "user", user_query, context=full_context)
-                self.memory.add_message(session_id, "assistant", answer_text, context=kg_connections_text)
-            except Exception:
-                pass
+    def get_message_context(self, message_id):
+        # Rebuilds the retrieved context of a past question: the frozen
+        # snapshot if there is one, otherwise the referenced chunks read back
+        # from their collection (None if it has since been compacted away).
+        context = self.memory.get_message_context(message_id)
+        if context is None or context.get("snapshot") or not context.get("chunks"):
+            return context
+        try:
+            if context.get("collection") == self.collection.name:
+                collection = self.collection
+            else:
+                collection = self.chroma_client.get_collection(name=context["collection"])
+            found = collection.get(ids=context["chunks"], include=["documents"])
+            docs = dict(zip(found["ids"], found["documents"]))
+            context["text"] = "\n".join(docs[cid] for cid in context["chunks"] if cid in docs)
+        except Exception:
+            context["text"] = None
+        return context
+
+    def _retrieve(self, user_query, neighbors):
+        # One batched query covers the user question and every neighbor not
+        # already memoized. The memo dict is swapped out on every collection
+        # write, so results computed against stale data land in a discarded
+        # dict instead of being served later. Returns context candidates for
+        # the packer, scored by vector distance; chunks reached through a
+        # graph neighbor count as weaker evidence than direct query hits,
+        # scaled by the neighbor's path weight (a dict of neighbor -> 0..1).
+        if not isinstance(neighbors, dict):
+            neighbors = dict.fromkeys(neighbors, 1.0)
+        memo = self._neighbor_memo
+        missing = [n for n in neighbors if n not in memo]
+        tracing.count("query.neighbor_memo_hits", len(neighbors) - len(missing))
+        tracing.count("query.neighbor_memo_misses", len(missing))
+        try:
+            query_embeddings = self.embedder.embed([user_query] + missing)
+            with tracing.span("query.retrieve", texts=len(missing) + 1):
+                results = self.collection.query(query_embeddings=query_embeddings, n_results=2)
+            hits = _result_hits(results)
+        except Exception:
+            hits = []
 
-        return answer_text
+        if len(memo) + len(missing) > NEIGHBOR_MEMO_SIZE:
+            memo.clear()
+        for neighbor, neighbor_hits in zip(missing, hits[1:]):
+            memo[neighbor] = neighbor_hits[:1]
+
+        candidates = []
+        for chunk_id, doc, distance in (hits[0] if hits else []):
+            candidates.append({"id": chunk_id, "text": doc, "score": 1.0 / (1.0 + distance)})
+        for neighbor, weight in neighbors.items():
+            for chunk_id, doc, distance in memo.get(neighbor, ()):
+                candidates.append({"id": chunk_id, "text": doc, "score": 0.5 * weight / (1.0 + distance)})
+        return candidates
 
     def reset_graph(self):
+        import networkx as nx
+
         self.graph = nx.DiGraph()
+        self.entity_matcher.clear()
+        self.node_rank.clear()
+        self._graph_weight = 0
 
-    def reset_vector_index(self):
+    def reset_vector_index(self, session_id=None):
+        if session_id is not None:
+            self.session_id = session_id
         self.collection = self._create_new_collection()
+        self._neighbor_memo = {}
 
-    def list_sessions(self, limit=None):
-        return self.memory.list_sessions(limit=limit)
+    def list_sessions(self, limit=None, before=None):
+        return self.memory.list_sessions(limit=limit, before=before)
 
     def get_session_messages(self, session_id):
-        return self.memory.get_session_messages(session_id)
\ No newline at end of file
+        return self.memory.get_session_messages(session_id)
+
+    def get_messages_page(self, session_id, after_id=None, before_id=None, limit=50):
+        return self.memory.get_messages_page(session_id, after_id=after_id, before_id=before_id, limit=limit)
+
+    def get_last_messages(self, session_id, limit=50):
+        return self.memory.get_last_messages(session_id, limit=limit)
+
+    def search_messages(self, text, limit=50, offset=0):
+        return self.memory.search(text, limit=limit, offset=offset)
\ No newline at end of file
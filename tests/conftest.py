@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules live flat in the project root.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench import FakeHiveMind, HashEmbeddingFunction  # noqa: E402
+from processor import HiveProcessor  # noqa: E402
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    # Offline engines as in the benchmarks: fake LLM, hashing embeddings,
+    # everything under tmp_path.
+    def make(core=None, name="data", **kwargs):
+        kwargs.setdefault("embedding_function", HashEmbeddingFunction())
+        kwargs.setdefault("use_answer_cache", False)
+        return HiveProcessor(core or FakeHiveMind(), data_dir=tmp_path / name, **kwargs)
+
+    return make
@@ -0,0 +1,69 @@
+import time
+
+from answer_cache import AnswerCache, context_fingerprint
+from bench import FakeHiveMind
+
+
+def test_lookup_needs_same_scope_stamp_fingerprint_and_a_similar_question(tmp_path):
+    cache = AnswerCache(tmp_path / "answers.db", threshold=0.9)
+    fp = context_fingerprint("model", "context", "graph", "")
+    cache.put("c1", "10:5:5", fp, "what is attention?", [1.0, 0.0], "It weighs tokens.")
+
+    assert cache.get("c1", "10:5:5", fp, [0.99, 0.05]) == "It weighs tokens."
+    assert cache.get("c1", "10:5:5", fp, [0.0, 1.0]) is None
+    assert cache.get("c2", "10:5:5", fp, [1.0, 0.0]) is None
+    assert cache.get("c1", "10:5:5", context_fingerprint("model", "context", "graph", "User: hi"), [1.0, 0.0]) is None
+    assert cache.get("c1", "11:5:5", fp, [1.0, 0.0]) is None
+
+    # A new stamp retires the scope's older answers.
+    cache.put("c1", "11:5:5", fp, "what is attention?", [1.0, 0.0], "Newer.")
+    assert cache.get("c1", "10:5:5", fp, [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_fingerprint_parts_do_not_run_together():
+    assert context_fingerprint("ab", "c") != context_fingerprint("a", "bc")
+
+
+def test_bounded_by_size_and_age(tmp_path):
+    cache = AnswerCache(tmp_path / "answers.db", max_bytes=300)
+    for i in range(5):
+        cache.put("c", "s", "f", f"q{i}", [float(i), 1.0], "x" * 100)
+    assert cache.stats()["bytes"] <= 300
+    assert cache.get("c", "s", "f", [4.0, 1.0]) == "x" * 100
+    assert cache.get("c", "s", "f", [0.0, 1.0]) is None
+
+    aged = AnswerCache(tmp_path / "aged.db", max_age=0.05)
+    aged.put("c", "s", "f", "q", [1.0], "a")
+    time.sleep(0.1)
+    assert aged.get("c", "s", "f", [1.0]) is None
+
+
+def test_engine_reuses_answers_only_for_the_same_prompt(make_engine):
+    core = FakeHiveMind()
+    engine = make_engine(core, use_answer_cache=True)
+    engine.add_chunks("paper.pdf", ["Attention weighs tokens.", "Transformers stack attention layers."])
+
+    report = {}
+    first = engine.query_nexus("what is attention?", report=report)
+    calls = core.calls
+    assert engine.query_nexus("What is attention?", report=report) == first
+    assert report["cached"] and core.calls == calls
+
+    # A follow-up is only reused after the same conversation.
+    engine.query_nexus("what is attention?", session_id="a")
+    engine.query_nexus("how do transformers work?", session_id="b")
+    engine.query_nexus("what is attention?", session_id="c")
+    calls = core.calls
+    engine.query_nexus("and then?", session_id="a", report=report)
+    assert not report["cached"]
+    engine.query_nexus("and then?", session_id="b", report=report)
+    assert not report["cached"]
+    engine.query_nexus("and then?", session_id="c", report=report)
+    assert report["cached"]
+    assert core.calls == calls + 2
+
+    # New chunks move the index stamp.
+    engine.add_chunks("other.pdf", ["Unrelated text about convolution."])
+    engine.query_nexus("what is attention?", report=report)
+    assert not report["cached"]
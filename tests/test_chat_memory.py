@@ -0,0 +1,175 @@
+import sqlite3
+
+import pytest
+
+from util import CHAT_SCHEMA_VERSION, ChatMemory
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    context TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+RETRIEVED = "Transformers rely on attention. " * 200
+GRAPH = "Transformer --uses--> Attention\nAttention --is--> Mechanism"
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    # A history file as written before the sessions table, FTS index and
+    # context references existed: free text in context, user_version 0.
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany(
+        "INSERT INTO messages (session_id, role, content, context, created_at) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("a", "user", "what is attention", RETRIEVED, "2024-01-01 10:00:00"),
+            ("a", "assistant", "attention weighs tokens", GRAPH, "2024-01-01 10:00:01"),
+            ("b", "user", "and transformers?", RETRIEVED, "2024-01-02 09:00:00"),
+            ("b", "assistant", "they stack attention layers", None, "2024-01-02 09:00:05"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_sessions_are_backfilled_from_legacy_messages(legacy_db):
+    memory = ChatMemory(legacy_db)
+    assert memory.list_sessions() == [
+        {"session_id": "b", "start_at": "2024-01-02 09:00:00", "end_at": "2024-01-02 09:00:05", "count": 2},
+        {"session_id": "a", "start_at": "2024-01-01 10:00:00", "end_at": "2024-01-01 10:00:01", "count": 2},
+    ]
+
+
+def test_new_messages_update_session_summary(tmp_path):
+    memory = ChatMemory(tmp_path / "chat.db")
+    memory.add_message("s", "user", "hello")
+    ids = memory.add_exchange("s", "question", "answer")
+    (session,) = memory.list_sessions()
+    assert session["session_id"] == "s"
+    assert session["count"] == 3
+    assert ids[1] == ids[0] + 1
+
+
+def test_list_sessions_keyset_pages(tmp_path):
+    memory = ChatMemory(tmp_path / "chat.db")
+    conn = sqlite3.connect(tmp_path / "chat.db")
+    # Many sessions share an end time, so paging has to break ties by id.
+    conn.executemany(
+        "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, 'user', 'hi', ?)",
+        [(f"s{i:02d}", f"2024-01-01 00:00:0{i % 3}") for i in range(25)],
+    )
+    conn.commit()
+
+    everything = memory.list_sessions()
+    assert len(everything) == 25
+    paged = []
+    before = None
+    while True:
+        page = memory.list_sessions(limit=7, before=before)
+        if not page:
+            break
+        paged.extend(page)
+        before = (page[-1]["end_at"], page[-1]["session_id"])
+    assert paged == everything
+    assert [s["end_at"] for s in everything] == sorted((s["end_at"] for s in everything), reverse=True)
+
+
+def test_messages_page_and_tail(tmp_path):
+    memory = ChatMemory(tmp_path / "chat.db")
+    for i in range(10):
+        memory.add_message("s", "user", f"m{i}")
+        memory.add_message("other", "user", f"x{i}")
+    first = memory.get_messages_page("s", limit=4)
+    assert [row[2] for row in first] == ["m0", "m1", "m2", "m3"]
+    after = memory.get_messages_page("s", after_id=first[-1][0], limit=4)
+    assert [row[2] for row in after] == ["m4", "m5", "m6", "m7"]
+    tail = memory.get_last_messages("s", limit=3)
+    assert [row[2] for row in tail] == ["m7", "m8", "m9"]
+    before = memory.get_messages_page("s", before_id=tail[0][0], limit=3)
+    assert [row[2] for row in before] == ["m4", "m5", "m6"]
+
+
+def test_search_matches_every_term_as_prefix(tmp_path):
+    memory = ChatMemory(tmp_path / "chat.db")
+    memory.add_message("a", "user", "How do transformers use attention?")
+    memory.add_message("a", "assistant", "Attention lets every token look at the others.")
+    memory.add_message("b", "user", "Explain gradient descent")
+    memory.add_message("b", "assistant", 'Quotes like "this" and * are plain text')
+
+    hits = memory.search("transform atten")
+    assert [h["id"] for h in hits] == [1]
+    assert hits[0]["session_id"] == "a"
+    assert {h["id"] for h in memory.search("attention")} == {1, 2}
+    assert memory.search("attention gradient") == []
+    assert memory.search("   ") == []
+    # FTS syntax in user input is taken literally rather than raising.
+    assert [h["id"] for h in memory.search('"this"')] == [4]
+
+    first = memory.search("attention", limit=1)
+    second = memory.search("attention", limit=1, offset=1)
+    assert {first[0]["id"], second[0]["id"]} == {1, 2}
+
+
+def test_search_index_built_for_existing_messages(legacy_db):
+    memory = ChatMemory(legacy_db)
+    assert memory.has_fts
+    assert [h["session_id"] for h in memory.search("stack layers")] == ["b"]
+
+
+def test_legacy_context_is_migrated_to_references(legacy_db):
+    memory = ChatMemory(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == CHAT_SCHEMA_VERSION
+    contexts = [row[0] for row in conn.execute("SELECT context FROM messages ORDER BY id")]
+    assert all(c is None or c.startswith("{") for c in contexts)
+    # Both copies of the retrieved text share one blob.
+    assert conn.execute("SELECT COUNT(*) FROM context_blobs").fetchone()[0] == 2
+
+    assert memory.get_message_context(1) == {"snapshot": RETRIEVED}
+    assert memory.get_message_context(2) == {"graph": GRAPH}
+    assert memory.get_message_context(3) == {"snapshot": RETRIEVED}
+    assert memory.get_message_context(4) is None
+
+
+def test_migration_runs_once(legacy_db):
+    ChatMemory(legacy_db).close()
+    conn = sqlite3.connect(legacy_db)
+    before = conn.execute("SELECT id, context FROM messages ORDER BY id").fetchall()
+    memory = ChatMemory(legacy_db)
+    assert conn.execute("SELECT id, context FROM messages ORDER BY id").fetchall() == before
+    assert memory.get_message_context(1) == {"snapshot": RETRIEVED}
+
+
+def test_exchange_context_round_trip(tmp_path):
+    memory = ChatMemory(tmp_path / "chat.db")
+    user_id, assistant_id = memory.add_exchange(
+        "s",
+        "q",
+        "a",
+        user_context={"collection": "c", "chunks": ["doc_1", "doc_2"], "snapshot": RETRIEVED},
+        assistant_context={"collection": "c", "graph": GRAPH},
+    )
+    assert memory.get_message_context(user_id) == {
+        "collection": "c", "chunks": ["doc_1", "doc_2"], "snapshot": RETRIEVED,
+    }
+    assert memory.get_message_context(assistant_id) == {"collection": "c", "graph": GRAPH}
+
+
+def test_compact_drops_only_unreferenced_blobs(legacy_db):
+    memory = ChatMemory(legacy_db)
+    assert memory.compact() == 0
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("UPDATE messages SET context = NULL WHERE id = 2")
+    conn.commit()
+    assert memory.compact() == 1
+    assert memory.get_message_context(1) == {"snapshot": RETRIEVED}
+    assert conn.execute("SELECT COUNT(*) FROM context_blobs").fetchone()[0] == 1
@@ -0,0 +1,84 @@
+import random
+
+from processor import _split_sentences, iter_chunks
+
+
+def make_pages(rnd, pages=6):
+    # Words are unique, so every sentence (and every piece of an over-long
+    # one) occurs exactly once in the document.
+    counter = 0
+    result = []
+    for number in range(1, pages + 1):
+        sentences = []
+        for _ in range(rnd.randint(3, 15)):
+            words = []
+            for _ in range(rnd.randint(1, 60 if rnd.random() < 0.1 else 12)):
+                words.append(f"w{counter}")
+                counter += 1
+            sentences.append(" ".join(words) + rnd.choice(".!?"))
+        result.append((number, "  ".join(sentences)))
+    return result
+
+
+def units_of(pages, chunk_size):
+    return [(unit, number) for number, text in pages for unit in _split_sentences(text, chunk_size)]
+
+
+def spans_of(chunks, units):
+    # Maps each chunk to the [start, end) range of units it is made of.
+    texts = [unit for unit, _ in units]
+    spans = []
+    for text, _ in chunks:
+        for start in range(len(texts)):
+            if not text.startswith(texts[start]):
+                continue
+            end = start + 1
+            while len(" ".join(texts[start:end])) < len(text):
+                end += 1
+            if " ".join(texts[start:end]) == text:
+                spans.append((start, end))
+                break
+        else:
+            raise AssertionError(f"chunk is not a run of whole sentences: {text[:60]!r}")
+    return spans
+
+
+def test_chunk_invariants():
+    rnd = random.Random(3)
+    for chunk_size, overlap in [(120, 40), (300, 0), (80, 79), (500, 150)]:
+        for _ in range(10):
+            pages = make_pages(rnd)
+            units = units_of(pages, chunk_size)
+            chunks = list(iter_chunks(pages, chunk_size, overlap))
+            spans = spans_of(chunks, units)
+
+            assert all(len(text) <= chunk_size for text, _ in chunks)
+            # Coverage: the first chunk starts at the first sentence, every
+            # chunk adds something new without skipping, and the last one
+            # ends at the last sentence.
+            assert spans[0][0] == 0
+            assert spans[-1][1] == len(units)
+            for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+                assert next_start <= end
+                assert next_end > end
+                carried = " ".join(unit for unit, _ in units[next_start:end])
+                assert len(carried) <= overlap
+            for (text, meta), (start, end) in zip(chunks, spans):
+                assert meta == {"page": units[start][1], "page_end": units[end - 1][1]}
+
+
+def test_overlap_keeps_trailing_sentences():
+    pages = [(1, "One two three. Four five six. Seven eight nine. Ten eleven twelve.")]
+    chunks = [text for text, _ in iter_chunks(pages, chunk_size=35, overlap=16)]
+    # "Seven eight nine." is longer than the overlap, so nothing is carried
+    # into the last chunk.
+    assert chunks == [
+        "One two three. Four five six.",
+        "Four five six. Seven eight nine.",
+        "Ten eleven twelve.",
+    ]
+
+
+def test_empty_input_gives_no_chunks():
+    assert list(iter_chunks([], 100, 20)) == []
+    assert list(iter_chunks([(1, "   ")], 100, 20)) == []
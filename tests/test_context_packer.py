@@ -0,0 +1,53 @@
+import random
+
+from context import ContextPacker, estimate_tokens
+
+
+def candidates():
+    rnd = random.Random(11)
+    words = "attention transformer gradient descent layer token graph entity model data".split()
+    result = []
+    for i in range(40):
+        text = " ".join(rnd.choice(words) for _ in range(rnd.randint(5, 40)))
+        result.append({"id": f"c{i}", "text": text, "score": round(rnd.random(), 2)})
+    # Repeated ids, repeated text and tied scores.
+    result.append({"id": "c3", "text": result[3]["text"], "score": 0.01})
+    result.append({"id": "dup", "text": "  " + result[5]["text"].upper() + " ", "score": result[5]["score"]})
+    result.append({"id": "tie_b", "text": "tie entity graph", "score": 0.5})
+    result.append({"id": "tie_a", "text": "tie model data", "score": 0.5})
+    return result
+
+
+def test_pack_is_deterministic_under_input_order():
+    packer = ContextPacker(token_budget=300)
+    expected = packer.pack(candidates())
+    rnd = random.Random(5)
+    for _ in range(20):
+        shuffled = candidates()
+        rnd.shuffle(shuffled)
+        assert packer.pack(shuffled) == expected
+
+
+def test_pack_respects_budget_and_drops_duplicates():
+    packer = ContextPacker(token_budget=300)
+    packed = packer.pack(candidates())
+    assert packed["tokens"] <= 300
+    texts = {}
+    for c in candidates():
+        texts.setdefault(c["id"], c["text"])
+    assert packed["tokens"] == sum(estimate_tokens(texts[i]) for i in packed["selected"])
+    assert len(packed["selected"]) == len(set(packed["selected"]))
+    reasons = {(d["id"], d["reason"]) for d in packed["dropped"]}
+    assert ("c3", "duplicate_id") in reasons
+    assert ("dup", "duplicate_text") in reasons
+    assert {d["reason"] for d in packed["dropped"]} <= {"duplicate_id", "duplicate_text", "budget"}
+
+
+def test_ties_break_by_id():
+    packer = ContextPacker(token_budget=1000, mmr_lambda=1.0)
+    packed = packer.pack([
+        {"id": "b", "text": "beta", "score": 1.0},
+        {"id": "a", "text": "alpha", "score": 1.0},
+        {"id": "c", "text": "gamma", "score": 2.0},
+    ])
+    assert packed["selected"] == ["c", "a", "b"]
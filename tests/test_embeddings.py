@@ -0,0 +1,48 @@
+import pytest
+
+from bench import HashEmbeddingFunction
+from embeddings import CachedEmbedder, EmbeddingCache
+
+
+class CountingEmbedding(HashEmbeddingFunction):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def __call__(self, input):
+        self.batches.append(list(input))
+        return super().__call__(input)
+
+
+def test_cache_round_trips_float32_vectors_per_model(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.db")
+    cache.put_many("m1", ["a", "b"], [[0.1, 0.2], [1.0, -1.0]])
+    a, b, c = cache.get_many("m1", ["a", "b", "c"])
+    assert b == [1.0, -1.0]
+    assert a == pytest.approx([0.1, 0.2], rel=1e-6)
+    assert c is None
+    assert cache.get_many("m2", ["a"]) == [None]
+    assert cache.stats() == {"hits": 2, "misses": 2, "entries": 2}
+
+
+def test_embedder_deduplicates_batches_and_reuses_the_cache(tmp_path):
+    fn = CountingEmbedding()
+    embedder = CachedEmbedder(fn, cache=EmbeddingCache(tmp_path / "cache.db"), batch_size=2)
+    texts = ["x", "y", "x", "z"]
+    first = embedder.embed(texts)
+    assert fn.batches == [["x", "y"], ["z"]]
+    assert first[0] == first[2]
+
+    # A new embedder over the same file (a new session or collection) embeds
+    # only the text it has not seen, and cached vectors equal fresh ones.
+    fn2 = CountingEmbedding()
+    again = CachedEmbedder(fn2, cache=EmbeddingCache(tmp_path / "cache.db"), batch_size=2).embed(["z", "w", "x"])
+    assert fn2.batches == [["w"]]
+    assert again[0] == first[3] and again[2] == first[0]
+
+
+def test_embedder_without_cache():
+    fn = CountingEmbedding()
+    embedder = CachedEmbedder(fn, batch_size=8)
+    assert embedder.embed(["a", "a"])[0] == embedder.embed(["a"])[0]
+    assert fn.batches == [["a"], ["a"]]
@@ -0,0 +1,102 @@
+import random
+
+import networkx as nx
+import pytest
+
+from graphsearch import NodeRank, best_first_paths
+from util import GraphStore
+
+
+def graph_of(*edges):
+    graph = nx.DiGraph()
+    for source, target, relation, weight in edges:
+        graph.add_edge(source, target, relation=relation, weight=weight)
+    return graph
+
+
+def pagerank_residual(graph, scores, damping=0.85):
+    # How far scores are from the weighted PageRank fixed point (dangling
+    # nodes spread their rank uniformly).
+    n = len(scores)
+    out = {node: sum(d["weight"] for d in graph[node].values()) for node in graph}
+    leak = damping * sum(scores[node] for node in graph if not out[node]) / n
+    expected = dict.fromkeys(graph, (1 - damping) / n + leak)
+    for source, target, data in graph.edges(data=True):
+        expected[target] += damping * scores[source] * data["weight"] / out[source]
+    return max(abs(expected[node] - scores[node]) for node in graph)
+
+
+def random_graph(n=60, edges=200, seed=1):
+    rnd = random.Random(seed)
+    return graph_of(*[(f"n{rnd.randrange(n)}", f"n{rnd.randrange(n)}", "r", rnd.randint(1, 3)) for _ in range(edges)])
+
+
+def test_rank_is_weighted_pagerank():
+    graph = graph_of(("a", "b", "r", 1), ("b", "c", "r", 3), ("c", "a", "r", 1), ("a", "c", "r", 2), ("c", "d", "r", 1))
+    rank = NodeRank()
+    assert rank.refresh(graph)
+    assert sum(rank.scores.values()) == pytest.approx(1.0)
+    assert pagerank_residual(graph, rank.scores) < 1e-5
+    assert max(rank.scores, key=rank.scores.get) == "c"
+    assert rank.importance(graph, "c") == 1.0
+    assert rank.importance(graph, "missing") == 0.0
+
+
+def test_rank_recomputes_only_when_invalidated_and_warm_starts():
+    graph = random_graph()
+    rank = NodeRank()
+    rank.refresh(graph)
+    cold = rank.iterations
+    assert not rank.refresh(graph)
+
+    graph.add_edge("n0", "new", relation="r", weight=1)
+    assert rank.get(graph) is rank.scores  # readers never recompute a computed rank
+    rank.invalidate()
+    assert rank.refresh(graph)
+    assert rank.iterations < cold
+    assert "new" in rank.scores
+    assert pagerank_residual(graph, rank.scores) < 1e-5
+
+
+def test_paths_come_out_best_first_within_budget():
+    graph = graph_of(
+        ("q", "strong", "uses", 5),
+        ("q", "weak", "mentions", 1),
+        ("strong", "far", "extends", 3),
+        ("far", "farther", "extends", 3),
+    )
+    rank = NodeRank()
+    paths = best_first_paths(graph, ["q", "missing"], rank, max_hops=2)
+    scores = [score for score, _, _ in paths]
+    assert scores == sorted(scores, reverse=True)
+    assert [nodes for _, nodes, _ in paths] == [["q", "strong"], ["q", "weak"], ["q", "strong", "far"]]
+    assert paths[2][2] == ["uses", "extends"]
+
+    assert len(best_first_paths(graph, ["q"], rank, max_paths=1)) == 1
+    # Only the seed is expanded: no two-hop paths.
+    assert all(len(nodes) == 2 for _, nodes, _ in best_first_paths(graph, ["q"], rank, max_expansions=1))
+    assert best_first_paths(graph, ["missing"], rank) == []
+
+
+def test_branch_limit_keeps_a_hub_from_filling_the_result():
+    graph = graph_of(*[("hub", f"leaf{i}", "has", 1) for i in range(20)], ("q", "hub", "is", 1), ("q", "x", "is", 1),
+                     ("x", "y", "is", 1))
+    paths = best_first_paths(graph, ["q"], NodeRank(), max_paths=12)
+    assert sum(nodes[-1].startswith("leaf") for _, nodes, _ in paths) == 4
+    assert ["q", "x", "y"] in [nodes for _, nodes, _ in paths]
+
+
+def test_relation_counts_are_kept_per_label(make_engine, tmp_path):
+    engine = make_engine()
+    engine.parse_and_add_to_graph("(Transformer, uses, Attention)\n(Transformer, uses, Attention)")
+    engine.parse_and_add_to_graph("(Transformer, relies on, Attention)")
+    data = engine.graph["Transformer"]["Attention"]
+    assert data["relations"] == {"uses": 2, "relies on": 1}
+    assert (data["relation"], data["weight"]) == ("uses", 3)
+
+    reopened = make_engine(collection_name=engine.collection.name)
+    assert reopened.graph["Transformer"]["Attention"] == data
+    store = GraphStore(tmp_path / "data" / "nexus_graph.db")
+    assert sorted(store.load_edges(engine.collection.name)) == [
+        ("Transformer", "Attention", "relies on", 1), ("Transformer", "Attention", "uses", 2),
+    ]
@@ -0,0 +1,97 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from util import HiveMind, LLMCache
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, model, contents):
+        self.calls += 1
+        return SimpleNamespace(text=f"{model}:{len(contents)}")
+
+    def generate_content_stream(self, model, contents):
+        self.calls += 1
+        for word in ("streamed", " ", "answer"):
+            yield SimpleNamespace(text=word)
+
+
+@pytest.fixture
+def hivemind(tmp_path, monkeypatch):
+    # A HiveMind with a fake client in place of google.genai.
+    for name in ("GENAI_API_KEY", "GEMINI_API_KEY", "HIVEMIND_NO_CACHE"):
+        monkeypatch.delenv(name, raising=False)
+
+    def make(**kwargs):
+        mind = HiveMind(cache_path=tmp_path / "llm_cache.db", **kwargs)
+        mind.client = SimpleNamespace(models=FakeModels())
+        return mind
+
+    return make
+
+
+def test_responses_are_keyed_by_model_and_prompt(tmp_path):
+    cache = LLMCache(tmp_path / "cache.db")
+    cache.put("m1", "prompt", "answer")
+    assert cache.get("m1", "prompt") == "answer"
+    assert cache.get("m2", "prompt") is None
+    assert cache.get("m1", "prompt ") is None
+    assert LLMCache(tmp_path / "cache.db").get("m1", "prompt") == "answer"
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 1, "bytes": len("answer")}
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = LLMCache(tmp_path / "cache.db", max_age=60)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.put("m", "p", "old")
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("m", "p") is None
+    cache.put("m", "q", "new")
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes(tmp_path, monkeypatch):
+    cache = LLMCache(tmp_path / "cache.db", max_bytes=30)
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    for name in ("a", "b", "c"):
+        clock[0] += 1
+        cache.put("m", name, name * 10)
+    clock[0] += 1
+    assert cache.get("m", "a") == "a" * 10
+    clock[0] += 1
+    cache.put("m", "d", "d" * 10)
+    assert cache.get("m", "b") is None
+    assert [cache.get("m", name) is not None for name in "acd"] == [True, True, True]
+    assert cache.stats()["bytes"] == 30
+
+
+def test_hivemind_calls_the_model_once_per_prompt(hivemind):
+    mind = hivemind()
+    first = mind.generate_content("question").text
+    assert mind.generate_content("question").text == first
+    assert mind.client.models.calls == 1
+    assert list(mind.generate_content_stream("stream me")) == ["streamed", " ", "answer"]
+    assert list(mind.generate_content_stream("stream me")) == ["streamed answer"]
+    assert mind.client.models.calls == 2
+
+
+def test_cache_can_be_turned_off(hivemind, monkeypatch):
+    monkeypatch.setenv("HIVEMIND_NO_CACHE", "1")
+    mind = hivemind()
+    mind.generate_content("question")
+    mind.generate_content("question")
+    assert mind.client.models.calls == 2
+
+
+def test_cancelled_stream_is_not_cached(hivemind):
+    mind = hivemind()
+    stream = mind.generate_content_stream("stream me")
+    next(stream)
+    stream.close()
+    assert list(mind.generate_content_stream("stream me")) == ["streamed", " ", "answer"]
@@ -0,0 +1,34 @@
+from markdown_render import insert_args, render_markdown, span_length
+
+
+def test_renders_the_supported_subset():
+    md = "# Title\n- **bold** and *it* with `code` and [a link](http://x)\n```\nx = 1\n```\nplain"
+    assert render_markdown(md) == [
+        ("Title\n", ("heading",)),
+        ("• ", ()),
+        ("bold", ("bold",)),
+        (" and ", ()),
+        ("it", ("italic",)),
+        (" with ", ()),
+        ("code", ("inline_code",)),
+        (" and a link\n", ()),
+        ("x = 1\n", ("codeblock",)),
+        ("plain\n", ()),
+    ]
+
+
+def test_adjacent_spans_with_the_same_tags_are_merged():
+    spans = render_markdown("one\ntwo\n\nthree")
+    assert spans == [("one\ntwo\n\nthree\n", ())]
+
+
+def test_unclosed_markers_stay_literal():
+    assert render_markdown("2 * 3 = 6, see `x") == [("2 * 3 = 6, see `x\n", ())]
+    assert render_markdown("```\nstreamed code") == [("streamed code\n", ("codeblock",))]
+
+
+def test_insert_args_and_length():
+    spans = render_markdown("**Hi** there")
+    assert insert_args(spans) == ["Hi", ("bold",), " there\n", ()]
+    assert span_length(spans) == len("Hi there\n")
+    assert insert_args([]) == [] and span_length([]) == 0
@@ -0,0 +1,41 @@
+import random
+
+from matcher import EntityMatcher
+
+
+def naive_match(names, text):
+    lowered = text.lower()
+    return {name for name in names if name and name.lower() in lowered}
+
+
+def test_matches_every_substring_occurrence():
+    names = ["Attention", "Self-Attention", "attention head", "Transformer", "former", "BERT", "a"]
+    matcher = EntityMatcher()
+    for name in names:
+        matcher.add(name)
+    text = "The Transformer uses self-attention; each attention head is small."
+    assert set(matcher.match(text)) == naive_match(names, text)
+
+
+def test_agrees_with_naive_scan_on_random_input():
+    rnd = random.Random(7)
+    alphabet = "abc "
+    for _ in range(200):
+        names = {"".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 5))) for _ in range(rnd.randint(1, 12))}
+        names |= {name.upper() for name in list(names)[:2]}
+        matcher = EntityMatcher()
+        for name in names:
+            matcher.add(name)
+        for _ in range(5):
+            text = "".join(rnd.choice(alphabet + "AB") for _ in range(rnd.randint(0, 40)))
+            assert set(matcher.match(text)) == naive_match(names, text)
+
+
+def test_names_added_after_matching_are_found():
+    matcher = EntityMatcher()
+    matcher.add("graph")
+    assert matcher.match("knowledge graph") == ["graph"]
+    matcher.add("knowledge")
+    assert set(matcher.match("knowledge graph")) == {"graph", "knowledge"}
+    matcher.clear()
+    assert matcher.match("knowledge graph") == []
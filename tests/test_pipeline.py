@@ -0,0 +1,114 @@
+import os
+import threading
+
+import pipeline
+from bench import FakeHiveMind, write_synthetic_pdf
+from pipeline import IngestPipeline
+
+
+def _flaky_stream(path, chunk_size, overlap, batch_size, slot):
+    # "crash" files kill their worker mid-document. A "lost" file returns
+    # its chunk count without sending the chunks the first time, as if its
+    # queued messages died with the process.
+    name = os.path.basename(path)
+    if name.startswith("crash"):
+        pipeline._started[slot] = 1
+        os._exit(1)
+    marker = path + ".seen"
+    if name.startswith("lost") and not os.path.exists(marker):
+        open(marker, "w").close()
+        pipeline._started[slot] = 1
+        return sum(len(batch) for _, batch in pipeline.iter_chunk_batches(path, chunk_size, overlap, batch_size))
+    return pipeline._stream_chunks(path, chunk_size, overlap, batch_size, slot)
+
+
+class FlakyPipeline(IngestPipeline):
+    def _submit_extract(self, pool, path, slot):
+        return pool.submit(
+            _flaky_stream, path, self.engine.chunk_size, self.engine.chunk_overlap, self.engine.batch_size, slot
+        )
+
+
+class FailingHiveMind(FakeHiveMind):
+    def extract_entities_and_relations(self, text_chunk):
+        raise RuntimeError("quota exceeded")
+
+
+def make_pdfs(tmp_path, names, pages=3):
+    return [str(write_synthetic_pdf(tmp_path / name, pages=pages, seed=i)) for i, name in enumerate(names)]
+
+
+def run(pipe, files, timeout=120):
+    # The pipeline used to hang on a dead worker; fail instead of waiting.
+    events = []
+    result = {}
+    pipe.on_progress = events.append
+    thread = threading.Thread(target=lambda: result.update(stats=pipe.run(files)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "ingest did not finish"
+    statuses = {os.path.basename(e["file"]): e["status"] for e in events if e["status"] != "extracted"}
+    return result["stats"], statuses
+
+
+def chunks_of(engine):
+    found = engine.collection.get()
+    return sorted(zip(found["ids"], found["documents"]))
+
+
+def test_pipeline_matches_process_pdf(tmp_path, make_engine):
+    files = make_pdfs(tmp_path, ["a.pdf", "b.pdf", "c.pdf"])
+    engine = make_engine(batch_size=8)
+    stats, statuses = run(IngestPipeline(engine, extract_workers=2, queue_size=2), files)
+    assert stats["files"] == 3 and stats["failed"] == 0
+    assert statuses == {"a.pdf": "indexed", "b.pdf": "indexed", "c.pdf": "indexed"}
+
+    reference = make_engine(name="reference", batch_size=8)
+    for path in files:
+        reference.process_pdf(path)
+    assert chunks_of(engine) == chunks_of(reference)
+    assert stats["chunks"] == reference.collection.count()
+    assert sorted(engine.graph.edges(data=True)) == sorted(reference.graph.edges(data=True))
+
+
+def test_unreadable_file_fails_alone(tmp_path, make_engine):
+    files = make_pdfs(tmp_path, ["a.pdf", "b.pdf"])
+    bad = tmp_path / "bad.pdf"
+    bad.write_text("not a pdf")
+    stats, statuses = run(IngestPipeline(make_engine(), extract_workers=1), [files[0], str(bad), files[1]])
+    assert statuses == {"a.pdf": "indexed", "bad.pdf": "error", "b.pdf": "indexed"}
+    assert (stats["files"], stats["failed"]) == (2, 1)
+
+
+def test_dead_worker_fails_only_its_file(tmp_path, make_engine):
+    files = make_pdfs(tmp_path, ["a.pdf", "crash.pdf", "b.pdf", "c.pdf", "d.pdf"])
+    engine = make_engine()
+    stats, statuses = run(FlakyPipeline(engine, extract_workers=1), files)
+    assert statuses == {"a.pdf": "indexed", "crash.pdf": "error", "b.pdf": "indexed",
+                        "c.pdf": "indexed", "d.pdf": "indexed"}
+
+    reference = make_engine(name="reference")
+    for path in files:
+        if "crash" not in path:
+            reference.process_pdf(path)
+    assert chunks_of(engine) == chunks_of(reference)
+
+
+def test_finished_file_with_lost_messages_is_retried(tmp_path, make_engine):
+    files = make_pdfs(tmp_path, ["lost.pdf", "crash.pdf", "b.pdf"])
+    engine = make_engine()
+    stats, statuses = run(FlakyPipeline(engine, extract_workers=1, queue_size=2), files)
+    assert statuses == {"lost.pdf": "indexed", "crash.pdf": "error", "b.pdf": "indexed"}
+
+    reference = make_engine(name="reference")
+    for path in (files[0], files[2]):
+        reference.process_pdf(path)
+    assert chunks_of(engine) == chunks_of(reference)
+    assert sorted(engine.graph.edges(data=True)) == sorted(reference.graph.edges(data=True))
+
+
+def test_extraction_failure_fails_the_file(tmp_path, make_engine):
+    files = make_pdfs(tmp_path, ["a.pdf", "b.pdf"])
+    stats, statuses = run(IngestPipeline(make_engine(FailingHiveMind()), extract_workers=1), files)
+    assert statuses == {"a.pdf": "error", "b.pdf": "error"}
+    assert (stats["files"], stats["failed"]) == (0, 2)
@@ -0,0 +1,51 @@
+import threading
+
+from bench import FakeHiveMind
+
+
+class StreamingHiveMind(FakeHiveMind):
+    def generate_content_stream(self, prompt):
+        self.calls += 1
+        yield from ("first ", "second ", "third")
+
+
+def test_cancel_before_start_skips_retrieval_and_model(make_engine):
+    core = StreamingHiveMind()
+    engine = make_engine(core)
+    cancel = threading.Event()
+    cancel.set()
+    assert list(engine.query_nexus_stream("what is attention?", session_id="s", cancel_event=cancel)) == []
+    assert core.calls == 0
+    assert engine.list_sessions() == []
+
+
+def test_cancel_mid_stream_keeps_the_partial_answer(make_engine):
+    engine = make_engine(StreamingHiveMind())
+    cancel = threading.Event()
+    received = []
+    for text in engine.query_nexus_stream("what is attention?", session_id="s", cancel_event=cancel):
+        received.append(text)
+        cancel.set()
+    assert received == ["first "]
+    rows = engine.get_last_messages("s")
+    assert [(role, content) for _, role, content, _ in rows] == [("user", "what is attention?"), ("assistant", "first ")]
+
+
+def test_report_is_filled_per_call(make_engine):
+    engine = make_engine()
+    engine.parse_and_add_to_graph("(Transformer, uses, Attention)")
+    engine.add_chunks("paper.pdf", ["Attention weighs tokens.", "Transformers stack attention layers."])
+    first, second = {"stale": True}, {}
+    engine.query_nexus("How does Transformer use Attention?", session_id="s", report=first)
+    list(engine.query_nexus_stream("unrelated question", report=second))
+
+    assert "stale" not in first
+    assert sorted(first["entities"]) == ["Attention", "Transformer"]
+    assert first["cached"] is False
+    assert first["context"]["selected"] and first["context"]["tokens"] > 0
+    question_id, answer_id = first["message_ids"]
+    rows = engine.get_last_messages("s")
+    assert [msg_id for msg_id, *_ in rows] == [question_id, answer_id]
+
+    assert second["entities"] == []
+    assert second["message_ids"] is None
@@ -0,0 +1,68 @@
+import processor
+
+
+def last_used(engine, name):
+    return {row["name"]: row for row in engine.registry.list()}[name]["last_used_at"]
+
+
+def age(engine, name, seconds):
+    with engine.registry._lock:
+        engine.registry._conn.execute(
+            "UPDATE collections SET last_used_at = last_used_at - ? WHERE name = ?", (seconds, name)
+        )
+        engine.registry._conn.commit()
+
+
+def test_questions_and_resume_count_as_use(make_engine):
+    engine = make_engine()
+    engine.bind_session("s1")
+    first = engine.collection.name
+    engine.add_chunks("paper.pdf", ["Attention weighs tokens."])
+
+    age(engine, first, 3600)
+    before = last_used(engine, first)
+    engine.query_nexus("what is attention?")
+    touched = last_used(engine, first)
+    assert touched > before
+    # A second question within the interval does not write again.
+    age(engine, first, 10)
+    engine.query_nexus("and again?")
+    assert last_used(engine, first) == touched - 10
+
+    engine.reset_vector_index(session_id="s2")
+    age(engine, first, 3600)
+    stale = last_used(engine, first)
+    assert engine.resume_session("s1")
+    assert engine.collection.name == first
+    assert last_used(engine, first) > stale
+
+
+def test_compact_opens_only_the_stores(make_engine, tmp_path):
+    engine = make_engine()
+    kept = engine.collection.name
+    engine.add_chunks("paper.pdf", ["Attention weighs tokens."])
+    engine.reset_vector_index(session_id="s2")
+    empty = engine.collection.name
+    engine.reset_vector_index(session_id="s3")
+    expired = engine.collection.name
+    engine.add_chunks("paper.pdf", ["Old notes."])
+    age(engine, expired, 40 * 86400)
+    engine.chroma_client.create_collection(name="orphan")
+
+    names = lambda: sorted(c if isinstance(c, str) else c.name for c in engine.chroma_client.list_collections())
+    before = names()
+    report = processor.compact_collections(tmp_path / "data", keep_last=0, dry_run=True, protect=[kept])
+    assert report["dropped"] == {empty: "empty", expired: "expired", "orphan": "orphaned"}
+    assert names() == before
+
+    processor.compact_collections(tmp_path / "data", keep_last=0, protect=[kept])
+    assert names() == [kept]
+    assert [row["name"] for row in engine.registry.list()] == [kept]
+
+
+def test_engine_compaction_protects_the_active_collection(make_engine):
+    engine = make_engine()
+    engine.reset_vector_index(session_id="s2")
+    report = engine.compact_collections(keep_last=0)
+    assert engine.collection.name not in report["dropped"]
+    assert list(report["dropped"].values()) == ["empty"]
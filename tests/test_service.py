@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from bench import FakeHiveMind, write_synthetic_pdf
+from cli import HiveService, make_handler
+from util import RWLock
+
+
+def test_readers_share_the_lock_and_writers_exclude_them():
+    lock = RWLock()
+    inside = []
+    with lock.reader, lock.reader:
+        acquired = threading.Event()
+
+        def write():
+            with lock.writer:
+                inside.append("writer")
+                acquired.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        assert not acquired.wait(0.2)
+    writer.join(2)
+    assert inside == ["writer"]
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = RWLock()
+    order = []
+    lock.acquire_read()
+
+    def write():
+        with lock.writer:
+            order.append("writer")
+
+    def read():
+        with lock.reader:
+            order.append("reader")
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while not lock._writers_waiting:
+        time.sleep(0.01)
+    reader = threading.Thread(target=read)
+    reader.start()
+    time.sleep(0.1)
+    assert order == []
+    lock.release_read()
+    writer.join(2)
+    reader.join(2)
+    assert order == ["writer", "reader"]
+
+
+class BlockingHiveMind(FakeHiveMind):
+    # generate_content waits until released, to observe the engine mid-call.
+    def __init__(self):
+        super().__init__()
+        self.in_call = threading.Event()
+        self.release = threading.Event()
+
+    def generate_content(self, prompt):
+        self.in_call.set()
+        self.release.wait(5)
+        return super().generate_content(prompt)
+
+
+def test_query_releases_the_read_lock_before_the_model_call(make_engine):
+    core = BlockingHiveMind()
+    service = HiveService(make_engine(core))
+    result = {}
+    query = threading.Thread(target=lambda: result.update(service.query("what is attention?")))
+    query.start()
+    assert core.in_call.wait(5)
+    written = threading.Event()
+
+    def write():
+        with service.lock.writer:
+            written.set()
+
+    threading.Thread(target=write, daemon=True).start()
+    assert written.wait(2), "ingest writes were blocked by an answer in progress"
+    core.release.set()
+    query.join(5)
+    assert result["answer"].startswith("Answer based on")
+
+
+@pytest.fixture
+def server(make_engine):
+    service = HiveService(make_engine())
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def call(url, body=None, raw=None):
+    data = raw if raw is not None else (json.dumps(body).encode() if body is not None else None)
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_api(server, tmp_path):
+    write_synthetic_pdf(tmp_path / "paper.pdf", pages=2)
+    status, stats = call(f"{server}/ingest", {"paths": [str(tmp_path)]})
+    assert status == 200
+    assert (stats["requested"], stats["files"], stats["failed"]) == (1, 1, 0)
+
+    status, graph = call(f"{server}/graph")
+    assert status == 200 and graph["edges"]
+    edge = graph["edges"][0]
+    assert set(edge) == {"source", "target", "relation", "weight", "relations"}
+    assert edge["weight"] == sum(edge["relations"].values())
+
+    status, answer = call(f"{server}/query", {"question": f"How does {edge['source']} work?"})
+    assert status == 200 and answer["answer"]
+    assert answer["cached"] is False and answer["context"]["selected"]
+    session = answer["session_id"]
+    status, follow_up = call(f"{server}/query", {"question": "and then?", "session_id": session})
+    assert follow_up["session_id"] == session
+
+    status, sessions = call(f"{server}/sessions?limit=10")
+    assert [s["session_id"] for s in sessions] == [session]
+    status, messages = call(f"{server}/sessions/{session}")
+    assert [m["role"] for m in messages] == ["user", "assistant", "user", "assistant"]
+    status, first = call(f"{server}/sessions/{session}?limit=2")
+    status, rest = call(f"{server}/sessions/{session}?limit=2&after={first[-1]['id']}")
+    assert [m["content"] for m in first + rest] == [m["content"] for m in messages]
+    status, hits = call(f"{server}/search?q=then")
+    assert [h["session_id"] for h in hits] == [session]
+
+    status, context = call(f"{server}/messages/{first[0]['id']}/context")
+    assert status == 200
+    assert context["chunks"] and context["text"]
+    status, context = call(f"{server}/messages/{first[1]['id']}/context")
+    assert context["graph"]
+    assert call(f"{server}/messages/999999/context")[0] == 404
+
+
+def test_http_errors(server):
+    assert call(f"{server}/query", {})[0] == 400
+    assert call(f"{server}/ingest", {})[0] == 400
+    assert call(f"{server}/query", raw=b"not json")[0] == 400
+    assert call(f"{server}/search")[0] == 400
+    assert call(f"{server}/nope")[0] == 404
+    assert call(f"{server}/nope", {})[0] == 404
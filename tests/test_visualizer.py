@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import matplotlib
+import networkx as nx
+import pytest
+
+matplotlib.use("Agg")
+
+from visualizer import GraphVisualizer  # noqa: E402
+
+
+@pytest.fixture
+def graph():
+    # Dense clusters of 40 joined by single bridges, 400 nodes in all.
+    graph = nx.DiGraph()
+    for c in range(10):
+        nodes = [f"c{c}n{i}" for i in range(40)]
+        for i, n in enumerate(nodes):
+            graph.add_edge(n, nodes[(i + 1) % 40], relation="next", weight=1)
+            graph.add_edge(n, nodes[(i * 7 + 3) % 40], relation="jump", weight=2)
+        graph.add_edge(nodes[0], f"c{(c + 1) % 10}n0", relation="bridge", weight=1)
+    return graph
+
+
+def test_small_graphs_are_drawn_in_full():
+    viz = GraphVisualizer(None, node_budget=50)
+    graph = nx.gnm_random_graph(30, 45, seed=1, directed=True)
+    viz.update_graph(graph)
+    assert set(viz._pos) == set(graph.nodes)
+
+
+def test_lod_view_stays_within_budget_around_the_focus(graph):
+    viz = GraphVisualizer(None, node_budget=40, edge_budget=60)
+    viz.update_graph(graph, focus=["c3n5", "missing"])
+    view = viz._lod_view(graph)
+    assert view.graph["lod"]
+    assert view.number_of_nodes() <= 40 and view.number_of_edges() <= 60
+    assert set(viz._pos) == set(view.nodes)
+
+    roles = dict(view.nodes(data="role"))
+    assert roles["c3n5"] == "focus"
+    assert all(roles[n] == "ego" for n in nx.all_neighbors(graph, "c3n5"))
+    explicit = [n for n, role in roles.items() if role != "cluster"]
+    hidden = sum(members for _, members in view.nodes(data="members") if members)
+    assert len(explicit) + hidden == graph.number_of_nodes()
+    # Only edges between real entities keep their label.
+    for u, v, data in view.edges(data=True):
+        assert ("relation" in data) == (not isinstance(u, tuple) and not isinstance(v, tuple))
+
+
+def test_clicking_a_cluster_expands_it_and_right_click_collapses(graph):
+    viz = GraphVisualizer(None, node_budget=60)
+    viz.update_graph(graph, focus=["c0n0"])
+    cluster = next(n for n in viz._pos if isinstance(n, tuple))
+    viz.ax.set_xlim(-1, 1)
+
+    x, y = viz._pos[cluster]
+    viz._on_click(SimpleNamespace(button=1, xdata=x, ydata=y))
+    roles = dict(viz._lod_view(graph).nodes(data="role"))
+    members = [n for n, role in roles.items() if role == "member"]
+    assert members and cluster not in roles
+    assert {viz._communities.assignment[n] for n in members} == {cluster[1]}
+
+    viz._on_click(SimpleNamespace(button=3, xdata=0.0, ydata=0.0))
+    assert cluster in viz._pos
+
+
+def test_a_new_graph_resets_expanded_clusters(graph):
+    viz = GraphVisualizer(None, node_budget=60)
+    viz.update_graph(graph)
+    viz._expanded.add(next(iter(viz._communities.members)))
+    viz.update_graph(graph.copy())
+    assert viz._expanded == set()
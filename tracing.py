@@ -0,0 +1,157 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+# Lightweight spans and counters for the ingest and query paths. Tracing is
+# off unless HIVEMIND_TRACE=1 (or enable() is called); while off, span()
+# returns a shared no-op object and count() returns immediately, so the
+# instrumentation can stay in hot paths.
+
+_lock = threading.Lock()
+_enabled = os.getenv("HIVEMIND_TRACE", "").strip().lower() in ("1", "true", "yes")
+_events = deque(maxlen=100000)
+_stats = {}
+_counters = {}
+_origin = time.perf_counter()
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _stats.clear()
+        _counters.clear()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **counts):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        duration = end - self.start
+        with _lock:
+            _events.append((self.name, self.start, duration, threading.get_ident(), self.counts))
+            stat = _stats.get(self.name)
+            if stat is None:
+                stat = _stats[self.name] = {"calls": 0, "total": 0.0, "max": 0.0, "counts": {}}
+            stat["calls"] += 1
+            stat["total"] += duration
+            stat["max"] = max(stat["max"], duration)
+            for key, value in self.counts.items():
+                if isinstance(value, (int, float)):
+                    stat["counts"][key] = stat["counts"].get(key, 0) + value
+        return False
+
+    def set(self, **counts):
+        self.counts.update(counts)
+
+
+def span(name, **counts):
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, counts)
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def summary():
+    with _lock:
+        rows = []
+        for name, stat in _stats.items():
+            rows.append({
+                "stage": name,
+                "calls": stat["calls"],
+                "total_ms": stat["total"] * 1000,
+                "mean_ms": stat["total"] * 1000 / stat["calls"],
+                "max_ms": stat["max"] * 1000,
+                "counts": dict(stat["counts"]),
+            })
+        counters = dict(_counters)
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return {"stages": rows, "counters": counters}
+
+
+def summary_table():
+    data = summary()
+    lines = [f"{'stage':<28} {'calls':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9}  counts"]
+    for row in data["stages"]:
+        counts = ", ".join(f"{k}={v}" for k, v in sorted(row["counts"].items()))
+        lines.append(
+            f"{row['stage']:<28} {row['calls']:>7} {row['total_ms']:>11.2f} "
+            f"{row['mean_ms']:>9.2f} {row['max_ms']:>9.2f}  {counts}"
+        )
+    if data["counters"]:
+        lines.append("")
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f"{name:<28} {value:>7}")
+    return "\n".join(lines)
+
+
+def export_chrome_trace(path):
+    # Complete ("X") events in microseconds; open in chrome://tracing or
+    # https://ui.perfetto.dev.
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+    trace = []
+    for name, start, duration, tid, counts in events:
+        trace.append({
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": (start - _origin) * 1e6,
+            "dur": duration * 1e6,
+            "pid": pid,
+            "tid": tid,
+            "args": counts,
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "otherData": {"counters": counters}}, f)
+
+
+def _export_at_exit():
+    path = os.getenv("HIVEMIND_TRACE_FILE")
+    if path and _stats:
+        export_chrome_trace(path)
+        print(summary_table())
+
+
+atexit.register(_export_at_exit)
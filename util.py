@@ -1,13 +1,209 @@
-from google import genai
 import os
 from pathlib import Path
+import random
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import json
+import zlib
+import tracing
+
+
+def _is_rate_limited(exc):
+    if getattr(exc, "code", None) == 429:
+        return True
+    message = str(exc)
+    return "RESOURCE_EXHAUSTED" in message or "429" in message
+
+
+class _AdaptiveLimiter:
+    # Caps concurrent API calls. The cap halves on every rate-limit response
+    # and creeps back up by one per successful call (AIMD).
+    def __init__(self, limit):
+        self.max_limit = max(1, int(limit))
+        self.limit = self.max_limit
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.active -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+            elif self.limit < self.max_limit:
+                self.limit += 1
+            self._cond.notify_all()
+
+
+class RWLock:
+    # Many readers or one writer. Waiting writers block new readers so a
+    # steady stream of queries cannot starve an ingest.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+        self.reader = _LockSide(self.acquire_read, self.release_read)
+        self.writer = _LockSide(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class _LockSide:
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._release()
+        return False
+
+
+class _Resp:
+    def __init__(self, text):
+        self.text = text
+
+
+class LLMCache:
+    # Content-addressed store of model responses keyed by
+    # sha256(model name + prompt). Entries older than max_age seconds are
+    # dropped and, past max_bytes, the least recently used ones go first.
+    def __init__(self, db_path, max_bytes=64 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.db_path = str(db_path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, prompt):
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model, prompt):
+        key = self.make_key(model, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, prompt, response):
+        key = self.make_key(model, prompt)
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._total += size - (old[0] if old else 0)
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        cur = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age,))
+        if cur.rowcount:
+            self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self._total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": self._total}
 
 
 class HiveMind:
-    def __init__(self, api_key=None, model_name="gemini-3-flash-preview"):
+    def __init__(self, api_key=None, model_name="gemini-3-flash-preview", max_in_flight=4,
+                 max_prompt_chars=6000, max_retries=5, cache_path=None, use_cache=None):
         self.api_key = api_key
         self.model = model_name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_prompt_chars = max_prompt_chars
+        self.max_retries = max_retries
+        self._limiter = _AdaptiveLimiter(self.max_in_flight)
+
+        # HIVEMIND_NO_CACHE=1 bypasses the response cache without code changes.
+        if use_cache is None:
+            use_cache = os.getenv("HIVEMIND_NO_CACHE", "").strip().lower() not in ("1", "true", "yes")
+        self.use_cache = use_cache
+        if cache_path is None:
+            cache_path = Path(__file__).resolve().parent / "Data" / "llm_cache.db"
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self.cache = LLMCache(cache_path)
 
         
         resolved = api_key or os.getenv("GENAI_API_KEY") or os.getenv("GEMINI_API_KEY")
@@ -25,6 +221,9 @@ class HiveMind:
 
         if resolved:
             resolved = resolved.strip()
+            # Imported on first use; google.genai takes most of a second.
+            from google import genai
+
             self.client = genai.Client(api_key=resolved)
             self.api_key = resolved
         else:
@@ -32,7 +231,50 @@ class HiveMind:
             self.api_key = None
 
     def extract_entities_and_relations(self, text_chunk):
-        prompt = f"""
+        if self.client:
+            return self._call_model(self._extraction_prompt(text_chunk)).text
+
+        return "Paper, mentions, Concept" #fallback
+
+    def extract_entities_batch(self, chunks, max_prompt_chars=None):
+        # Packs consecutive chunks into shared prompts and keeps up to
+        # max_in_flight requests running. Yields (chunk_indices, triples_text)
+        # in completion order, not input order.
+        chunks = list(chunks)
+        if not chunks:
+            return
+        if not self.client:
+            for i in range(len(chunks)):
+                yield [i], "Paper, mentions, Concept"
+            return
+
+        groups = self._pack_chunks(chunks, max_prompt_chars or self.max_prompt_chars)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = {
+                pool.submit(self._call_model, self._extraction_prompt("\n\n".join(chunks[i] for i in group))): group
+                for group in groups
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result().text
+
+    @staticmethod
+    def _pack_chunks(chunks, max_chars):
+        groups = []
+        current = []
+        size = 0
+        for i, chunk in enumerate(chunks):
+            if current and size + len(chunk) > max_chars:
+                groups.append(current)
+                current = []
+                size = 0
+            current.append(i)
+            size += len(chunk)
+        if current:
+            groups.append(current)
+        return groups
+
+    def _extraction_prompt(self, text):
+        return f"""
 You are a knowledge graph builder. Extract core scientific entities and their
 relationships from this research text.
 
@@ -42,36 +284,135 @@ Output ONLY in this format:
 
 Example: (Backpropagation, used_in, Neural Networks)
 
-Text: {text_chunk}
+Text: {text}
 """
-        if self.client:
-            response = self.client.models.generate_content(model=self.model, contents=prompt)
-            return response.text
-        
-        return "Paper, mentions, Concept" #fallback
+
+    def _call_model(self, prompt):
+        if self.use_cache:
+            cached = self.cache.get(self.model, prompt)
+            if cached is not None:
+                tracing.count("llm.cache_hits")
+                return _Resp(cached)
+            tracing.count("llm.cache_misses")
+
+        with tracing.span("llm.call", prompt_chars=len(prompt)):
+            response = self._call_with_backoff(prompt)
+        text = getattr(response, "text", None)
+        if self.use_cache and isinstance(text, str) and text:
+            self.cache.put(self.model, prompt, text)
+        return response
+
+    def _call_with_backoff(self, prompt):
+        attempt = 0
+        while True:
+            self._limiter.acquire()
+            try:
+                response = self.client.models.generate_content(model=self.model, contents=prompt)
+            except Exception as e:
+                throttled = _is_rate_limited(e)
+                self._limiter.release(throttled=throttled)
+                if not throttled or attempt >= self.max_retries:
+                    raise
+                tracing.count("llm.rate_limited")
+                time.sleep(min(60.0, 2 ** attempt) + random.uniform(0, 1))
+                attempt += 1
+                continue
+            self._limiter.release()
+            return response
 
     def generate_content(self, prompt):
         if self.client:
-            return self.client.models.generate_content(model=self.model, contents=prompt)
-
-        class _Resp:
-            def __init__(self, text):
-                self.text = text
+            return self._call_model(prompt)
 
         return _Resp("[no-api-key]")
 
+    def generate_content_stream(self, prompt):
+        if not self.client:
+            yield "[no-api-key]"
+            return
+
+        if self.use_cache:
+            cached = self.cache.get(self.model, prompt)
+            if cached is not None:
+                tracing.count("llm.cache_hits")
+                yield cached
+                return
+            tracing.count("llm.cache_misses")
+
+        parts = []
+        throttled = False
+        with tracing.span("llm.call", prompt_chars=len(prompt), stream=1) as sp:
+            started = time.perf_counter()
+            self._limiter.acquire()
+            try:
+                for chunk in self.client.models.generate_content_stream(model=self.model, contents=prompt):
+                    text = getattr(chunk, "text", None)
+                    if text:
+                        if not parts:
+                            sp.set(first_token_ms=int((time.perf_counter() - started) * 1000))
+                        parts.append(text)
+                        yield text
+            except Exception as e:
+                throttled = _is_rate_limited(e)
+                raise
+            finally:
+                self._limiter.release(throttled=throttled)
+
+        # Only completed streams are cached; a cancelled one never gets here.
+        if self.use_cache and parts:
+            self.cache.put(self.model, prompt, "".join(parts))
+
+
+# Bumped whenever _migrate learns a new step; stored in PRAGMA user_version.
+CHAT_SCHEMA_VERSION = 1
+# Context fields that hold text; it lives zlib-compressed and deduplicated
+# in context_blobs and the message keeps only its hash.
+_CONTEXT_BLOB_FIELDS = ("snapshot", "graph")
+
+
+def _parse_context(text):
+    # Returns the reference dict for contexts written by ChatMemory, or None
+    # for legacy free-text context.
+    if not text.startswith("{"):
+        return None
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(value, dict) and set(value) & {"collection", "chunks", "snapshot", "graph"}:
+        return value
+    return None
+
 
 class ChatMemory:
+    # Connections are cached per thread and opened in WAL mode so the UI,
+    # ingest workers and history browser can read while a write commits.
+    # A message's context is a small JSON reference, e.g.
+    # {"collection": ..., "chunks": [chunk ids], "snapshot": <blob hash>}.
     def __init__(self, db_path):
         self.db_path = str(db_path)
+        self._local = threading.local()
+        self.has_fts = False
         self._init_db()
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
 
     def _init_db(self):
         conn = self._connect()
-        try:
+        with conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -85,27 +426,215 @@ class ChatMemory:
                 )
                 """
             )
-            conn.commit()
-        finally:
-            conn.close()
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    start_at TIMESTAMP,
+                    end_at TIMESTAMP,
+                    count INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # (end_at, session_id) is the keyset the history browser pages by.
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_end ON sessions (end_at, session_id)")
+            cur.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_messages_session_summary
+                AFTER INSERT ON messages
+                BEGIN
+                    INSERT INTO sessions (session_id, start_at, end_at, count)
+                    VALUES (NEW.session_id, NEW.created_at, NEW.created_at, 1)
+                    ON CONFLICT(session_id) DO UPDATE SET
+                        end_at = NEW.created_at,
+                        count = count + 1;
+                END
+                """
+            )
+            # Databases created before the summary table existed are
+            # backfilled once from the messages they already hold.
+            has_sessions = cur.execute("SELECT 1 FROM sessions LIMIT 1").fetchone()
+            if not has_sessions:
+                cur.execute(
+                    """
+                    INSERT INTO sessions (session_id, start_at, end_at, count)
+                    SELECT session_id, MIN(created_at), MAX(created_at), COUNT(*)
+                    FROM messages GROUP BY session_id
+                    """
+                )
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS context_blobs (
+                    hash TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL
+                )
+                """
+            )
+        self._init_fts(conn)
+        self._migrate(conn)
+
+    def _migrate(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= CHAT_SCHEMA_VERSION:
+            return
+        if version < 1:
+            self._compact_legacy_context(conn)
+        conn.execute(f"PRAGMA user_version = {CHAT_SCHEMA_VERSION}")
+        conn.commit()
+
+    def _compact_legacy_context(self, conn):
+        # Version 0 stored the full retrieved text on user messages and the
+        # graph connections on assistant messages. The chunk ids behind that
+        # text were never recorded, so it is kept as a deduplicated snapshot
+        # blob; the file is then vacuumed to hand the space back.
+        last_id = 0
+        converted = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, role, context FROM messages WHERE id > ? AND context IS NOT NULL ORDER BY id LIMIT 500",
+                (last_id,),
+            ).fetchall()
+            if not rows:
+                break
+            with conn:
+                updates = []
+                for msg_id, role, context in rows:
+                    if _parse_context(context) is None:
+                        field = "graph" if role == "assistant" else "snapshot"
+                        updates.append((self._encode_context(conn, {field: context}), msg_id))
+                conn.executemany("UPDATE messages SET context = ? WHERE id = ?", updates)
+            converted += len(updates)
+            last_id = rows[-1][0]
+        if converted:
+            conn.execute("VACUUM")
+
+    def _store_blob(self, conn, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        conn.execute(
+            "INSERT OR IGNORE INTO context_blobs (hash, data, size) VALUES (?, ?, ?)",
+            (digest, zlib.compress(text.encode("utf-8")), len(text)),
+        )
+        return digest
+
+    def _encode_context(self, conn, context):
+        if context is None or isinstance(context, str):
+            return context
+        ref = {}
+        for key, value in context.items():
+            if key in _CONTEXT_BLOB_FIELDS:
+                if value:
+                    ref[key] = self._store_blob(conn, value)
+            elif value:
+                ref[key] = value
+        return json.dumps(ref, separators=(",", ":")) if ref else None
+
+    def _init_fts(self, conn):
+        # External-content FTS5 index over messages.content, kept in sync by
+        # triggers and built once for databases that predate it. SQLite
+        # builds without FTS5 fall back to LIKE in search().
+        try:
+            with conn:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+                ).fetchone()
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts "
+                    "USING fts5(content, content='messages', content_rowid='id')"
+                )
+                conn.execute(
+                    """
+                    CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert AFTER INSERT ON messages
+                    BEGIN
+                        INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+                    END
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete AFTER DELETE ON messages
+                    BEGIN
+                        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+                    END
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update AFTER UPDATE OF content ON messages
+                    BEGIN
+                        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+                        INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+                    END
+                    """
+                )
+                if not exists:
+                    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable: {e}")
+            self.has_fts = False
 
     def add_message(self, session_id, role, content, context=None):
         conn = self._connect()
-        try:
-            cur = conn.cursor()
-            cur.execute(
+        with conn:
+            conn.execute(
                 "INSERT INTO messages (session_id, role, content, context) VALUES (?, ?, ?, ?)",
-                (session_id, role, content, context),
+                (session_id, role, content, self._encode_context(conn, context)),
             )
-            conn.commit()
-        finally:
-            conn.close()
+
+    def add_exchange(self, session_id, user_content, assistant_content, user_context=None, assistant_context=None):
+        # Contexts are dicts (see the class comment); plain strings are
+        # stored as given. Returns the ids of the two messages.
+        conn = self._connect()
+        sql = "INSERT INTO messages (session_id, role, content, context) VALUES (?, ?, ?, ?)"
+        with tracing.span("memory.write"), conn:
+            user_id = conn.execute(
+                sql, (session_id, "user", user_content, self._encode_context(conn, user_context))
+            ).lastrowid
+            assistant_id = conn.execute(
+                sql, (session_id, "assistant", assistant_content, self._encode_context(conn, assistant_context))
+            ).lastrowid
+        return user_id, assistant_id
+
+    def get_message_context(self, message_id):
+        # The stored reference with blob fields expanded back to text.
+        conn = self._connect()
+        row = conn.execute("SELECT context FROM messages WHERE id = ?", (message_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        context = _parse_context(row[0])
+        if context is None:
+            return {"snapshot": row[0]}
+        for key in _CONTEXT_BLOB_FIELDS:
+            if key in context:
+                blob = conn.execute("SELECT data FROM context_blobs WHERE hash = ?", (context[key],)).fetchone()
+                context[key] = zlib.decompress(blob[0]).decode("utf-8") if blob else None
+        return context
+
+    def compact(self):
+        # Drops blobs no message refers to any more and vacuums the file.
+        conn = self._connect()
+        with conn:
+            cur = conn.execute(
+                """
+                DELETE FROM context_blobs WHERE hash NOT IN (
+                    SELECT json_extract(context, '$.snapshot') FROM messages
+                    WHERE json_valid(context) AND json_extract(context, '$.snapshot') IS NOT NULL
+                    UNION
+                    SELECT json_extract(context, '$.graph') FROM messages
+                    WHERE json_valid(context) AND json_extract(context, '$.graph') IS NOT NULL
+                )
+                """
+            )
+            removed = cur.rowcount
+        conn.execute("VACUUM")
+        return removed
 
     def get_recent_context(self, session_id, limit=6):
         conn = self._connect()
-        try:
-            cur = conn.cursor()
-            cur.execute(
+        with tracing.span("memory.read"):
+            cur = conn.execute(
                 """
                 SELECT role, content
                 FROM messages
@@ -116,8 +645,6 @@ class ChatMemory:
                 (session_id, limit),
             )
             rows = list(reversed(cur.fetchall()))
-        finally:
-            conn.close()
 
         if not rows:
             return ""
@@ -127,18 +654,20 @@ class ChatMemory:
             lines.append(f"{role.capitalize()}: {content}")
         return "\n".join(lines)
 
-    def list_sessions(self, limit=None):
+    def list_sessions(self, limit=None, before=None):
+        # Newest first. For the next page pass before=(end_at, session_id)
+        # of the last session already shown.
         conn = self._connect()
-        try:
-            cur = conn.cursor()
-            query = (
-                "SELECT session_id, MIN(created_at), MAX(created_at), COUNT(*) "
-                "FROM messages GROUP BY session_id ORDER BY MAX(created_at) DESC"
-            )
-            cur.execute(query)
-            rows = cur.fetchall()
-        finally:
-            conn.close()
+        query = "SELECT session_id, start_at, end_at, count FROM sessions"
+        params = []
+        if before is not None:
+            query += " WHERE (end_at, session_id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY end_at DESC, session_id DESC"
+        if limit is not None and limit > 0:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = conn.execute(query, params).fetchall()
 
         sessions = []
         for session_id, start_at, end_at, count in rows:
@@ -150,25 +679,209 @@ class ChatMemory:
                     "count": count,
                 }
             )
-        if limit is not None and limit > 0:
-            return sessions[:limit]
         return sessions
 
     def get_session_messages(self, session_id):
         conn = self._connect()
-        try:
-            cur = conn.cursor()
-            cur.execute(
+        cur = conn.execute(
+            """
+            SELECT role, content, created_at
+            FROM messages
+            WHERE session_id = ?
+            ORDER BY id ASC
+            """,
+            (session_id,),
+        )
+        return cur.fetchall()
+
+    def get_messages_page(self, session_id, after_id=None, before_id=None, limit=50):
+        # One page of a transcript as (id, role, content, created_at), oldest
+        # first: the first page, the page after after_id, or the page ending
+        # just before before_id.
+        conn = self._connect()
+        if before_id is not None:
+            rows = conn.execute(
+                "SELECT id, role, content, created_at FROM messages "
+                "WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before_id, limit),
+            ).fetchall()
+            return list(reversed(rows))
+        return conn.execute(
+            "SELECT id, role, content, created_at FROM messages "
+            "WHERE session_id = ? AND id > ? ORDER BY id ASC LIMIT ?",
+            (session_id, after_id if after_id is not None else 0, limit),
+        ).fetchall()
+
+    def get_last_messages(self, session_id, limit=50):
+        # The newest limit messages of a transcript, oldest first, in the
+        # same shape as get_messages_page.
+        rows = self._connect().execute(
+            "SELECT id, role, content, created_at FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit),
+        ).fetchall()
+        return list(reversed(rows))
+
+    def search(self, text, limit=50, offset=0):
+        # Best matches first across all sessions, as dicts with the message
+        # id, session, role, time and a short snippet around the match.
+        terms = text.split()
+        if not terms:
+            return []
+        conn = self._connect()
+        if self.has_fts:
+            # Every word must match, as a prefix; quoting keeps FTS syntax
+            # characters in user input literal.
+            match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+            rows = conn.execute(
                 """
-                SELECT role, content, created_at
-                FROM messages
-                WHERE session_id = ?
-                ORDER BY id ASC
+                SELECT m.id, m.session_id, m.role, m.created_at,
+                       snippet(messages_fts, 0, '[', ']', '...', 12)
+                FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+                ORDER BY bm25(messages_fts), m.id DESC
+                LIMIT ? OFFSET ?
                 """,
-                (session_id,),
+                (match, limit, offset),
+            ).fetchall()
+        else:
+            where = " AND ".join("content LIKE ?" for _ in terms)
+            rows = conn.execute(
+                f"SELECT id, session_id, role, created_at, substr(content, 1, 120) FROM messages "
+                f"WHERE {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                [f"%{term}%" for term in terms] + [limit, offset],
+            ).fetchall()
+        return [
+            {"id": row_id, "session_id": session_id, "role": role, "created_at": created_at, "snippet": snippet}
+            for row_id, session_id, role, created_at, snippet in rows
+        ]
+
+
+class GraphStore:
+    # Append-only edge log for the knowledge graph, scoped by the name of the
+    # collection the edges were extracted from. Each parse batch is written
+    # in one transaction. Rows are per relation label: re-extracting
+    # (source, relation, target) bumps that label's weight (how many times it
+    # was seen), so repeated evidence for different labels is kept apart.
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS edges (
+                scope TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                relation TEXT NOT NULL DEFAULT '',
+                weight INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (scope, source, target, relation)
             )
-            rows = cur.fetchall()
-        finally:
-            conn.close()
+            """
+        )
+        self._conn.commit()
+
+    def add_edges(self, scope, edges):
+        if not edges:
+            return
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO edges (scope, source, target, relation, weight) VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT(scope, source, target, relation) DO UPDATE SET weight = edges.weight + 1
+                """,
+                [(scope, source, target, relation) for source, target, relation in edges],
+            )
+            self._conn.commit()
+
+    def load_edges(self, scope):
+        # One row per (source, target, relation), in first-seen order.
+        with self._lock:
+            return self._conn.execute(
+                "SELECT source, target, relation, weight FROM edges WHERE scope = ? ORDER BY rowid", (scope,)
+            ).fetchall()
+
+    def drop(self, scope):
+        with self._lock:
+            self._conn.execute("DELETE FROM edges WHERE scope = ?", (scope,))
+            self._conn.commit()
+
+
+class CollectionRegistry:
+    # Records which session owns which Chroma collection, when it was
+    # created and last used, and how many chunks it holds. Drives resuming a
+    # session's index and garbage-collecting abandoned ones.
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS collections (
+                name TEXT PRIMARY KEY,
+                session_id TEXT,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                doc_count INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_collections_session ON collections (session_id)")
+        self._conn.commit()
+
+    def register(self, name, session_id=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO collections (name, session_id, created_at, last_used_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    session_id = COALESCE(excluded.session_id, collections.session_id),
+                    last_used_at = excluded.last_used_at
+                """,
+                (name, session_id, now, now),
+            )
+            self._conn.commit()
+
+    def touch(self, name, doc_count=None):
+        with self._lock:
+            if doc_count is None:
+                self._conn.execute("UPDATE collections SET last_used_at = ? WHERE name = ?", (time.time(), name))
+            else:
+                self._conn.execute(
+                    "UPDATE collections SET last_used_at = ?, doc_count = ? WHERE name = ?",
+                    (time.time(), doc_count, name),
+                )
+            self._conn.commit()
+
+    def collection_for_session(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name FROM collections WHERE session_id = ? ORDER BY last_used_at DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def list(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, session_id, created_at, last_used_at, doc_count FROM collections "
+                "ORDER BY last_used_at DESC"
+            ).fetchall()
+        return [
+            {
+                "name": name,
+                "session_id": session_id,
+                "created_at": created_at,
+                "last_used_at": last_used_at,
+                "doc_count": doc_count,
+            }
+            for name, session_id, created_at, last_used_at, doc_count in rows
+        ]
 
-        return rows
+    def remove(self, names):
+        with self._lock:
+            self._conn.executemany("DELETE FROM collections WHERE name = ?", [(n,) for n in names])
+            self._conn.commit()
@@ -1,59 +1,336 @@
 import tkinter as tk
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import networkx as nx
+import heapq
+from collections import Counter
 import math
+import random
+import threading
+import tracing
+from graphsearch import Communities
 
 
 class GraphVisualizer:
-    def __init__(self, parent_frame):
+    # Graphs up to node_budget nodes are drawn in full. Larger ones switch to
+    # a level-of-detail view of at most node_budget nodes: the ego network
+    # around the focus entities (the last question's matches), the members
+    # of clusters the user clicked open, and one super-node per remaining
+    # community, with at most edge_budget (default 2 x node_budget) edges.
+    # node_budget=None always draws everything.
+    def __init__(self, parent_frame, debounce_ms=250, refine_iterations=30, node_budget=150, ego_hops=2,
+                 edge_budget=None):
         self.fig = Figure(figsize=(7, 7), dpi=100)
         self.ax = self.fig.add_subplot(111)
         self.fig.patch.set_facecolor("white")
 
-        self.canvas = FigureCanvasTkAgg(self.fig, master=parent_frame)
-        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        # Without a parent frame the figure renders off-screen (benchmarks,
+        # headless runs) and updates are drawn synchronously.
+        if parent_frame is None:
+            self.canvas = FigureCanvasAgg(self.fig)
+        else:
+            self.canvas = FigureCanvasTkAgg(self.fig, master=parent_frame)
+            self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.headless = parent_frame is None
+
+        self.debounce_ms = debounce_ms
+        self.refine_iterations = refine_iterations
+        # Node positions survive between redraws so each layout pass only
+        # has to settle the nodes that were added since the last one.
+        self._pos = {}
+        self._pending_graph = None
+        self._after_id = None
+        self._rng = random.Random(42)
+
+        self.node_budget = node_budget
+        self.ego_hops = ego_hops
+        self.edge_budget = edge_budget if edge_budget is not None else 2 * (node_budget or 0)
+        self._graph = None
+        self._focus = []
+        self._expanded = set()
+        self._communities = Communities()
+        self._community_job = None
+        self._community_generation = 0
+        self.canvas.mpl_connect("button_press_event", self._on_click)
+
+    def update_graph(self, nx_graph, focus=None):
+        # Calls arriving within debounce_ms of each other collapse into one
+        # redraw of the most recent graph. focus (entity names) replaces the
+        # ego-network centre; None keeps the current one.
+        if focus is not None:
+            self._focus = list(focus)
+        self._pending_graph = nx_graph
+        if self.headless:
+            self._flush()
+        elif self._after_id is None:
+            self._after_id = self.canvas.get_tk_widget().after(self.debounce_ms, self._flush)
+
+    def _flush(self):
+        self._after_id = None
+        nx_graph, self._pending_graph = self._pending_graph, None
+        if nx_graph is not self._graph:
+            self._graph = nx_graph
+            self._expanded = set()
+            self._communities = Communities()
+            self._community_generation += 1
+        try:
+            if self._use_lod(nx_graph):
+                # Only the view is copied, so the cost follows node_budget
+                # rather than the size of the graph.
+                snapshot = self._lod_view(nx_graph)
+            else:
+                snapshot = nx_graph.copy() if nx_graph is not None else None
+        except RuntimeError:
+            # The ingest writer mutated the graph mid-copy; try again shortly.
+            self.update_graph(nx_graph)
+            return
+        self._redraw(snapshot)
+
+    def _use_lod(self, nx_graph):
+        return nx_graph is not None and self.node_budget is not None and nx_graph.number_of_nodes() > self.node_budget
+
+    def _refresh_communities(self, nx_graph):
+        communities = self._communities
+        if communities.needs_full(nx_graph) and self._community_job is None:
+            if self.headless:
+                communities.compute_full(nx_graph)
+            else:
+                # Louvain over thousands of nodes takes a while; it runs on a
+                # copy in the background and the view redraws when it lands.
+                snapshot = nx_graph.copy()
+                generation = self._community_generation
+                self._community_job = threading.Thread(
+                    target=self._compute_communities, args=(communities, snapshot, generation), daemon=True
+                )
+                self._community_job.start()
+        communities.update(nx_graph)
+        return communities
+
+    def _compute_communities(self, communities, snapshot, generation):
+        with tracing.span("viz.communities", nodes=snapshot.number_of_nodes()):
+            communities.compute_full(snapshot)
+        self.canvas.get_tk_widget().after(0, self._communities_ready, generation)
+
+    def _communities_ready(self, generation):
+        self._community_job = None
+        if generation == self._community_generation and self._graph is not None:
+            self.update_graph(self._graph)
+
+    def _lod_view(self, nx_graph):
+        communities = self._refresh_communities(nx_graph)
+        assignment = communities.assignment
+        budget = self.node_budget
+        shown = {}
+
+        # Ego network: focus entities, then their neighbors hop by hop,
+        # strongest edges first, using up to 60% of the budget.
+        frontier = [n for n in dict.fromkeys(self._focus) if n in nx_graph]
+        for n in frontier:
+            shown[n] = "focus"
+        ego_cap = budget * 3 // 5
+        for _ in range(self.ego_hops):
+            if not frontier or len(shown) >= ego_cap:
+                break
+            found = {}
+            for n in frontier:
+                for m, data in nx_graph.succ[n].items():
+                    if m not in shown:
+                        found[m] = max(found.get(m, 0), data.get("weight", 1))
+                for m, data in nx_graph.pred[n].items():
+                    if m not in shown:
+                        found[m] = max(found.get(m, 0), data.get("weight", 1))
+            frontier = heapq.nlargest(ego_cap - len(shown), found, key=lambda m: (found[m], str(m)))
+            for m in frontier:
+                shown[m] = "ego"
 
-    def update_graph(self, nx_graph):
+        # Clusters the user expanded, best-connected members first.
+        for cid in sorted(self._expanded, key=str):
+            room = budget - len(shown)
+            if room <= 0:
+                break
+            candidates = [m for m in communities.members.get(cid, ()) if m not in shown and m in nx_graph]
+            for m in heapq.nlargest(room, candidates, key=lambda m: (nx_graph.degree(m), str(m))):
+                shown[m] = "member"
+
+        # Every other community becomes one super-node, largest first, while
+        # the budget lasts.
+        taken = Counter(assignment.get(n) for n in shown)
+        hidden = {}
+        for cid, members in communities.members.items():
+            count = len(members) - taken.get(cid, 0)
+            if count > 0:
+                hidden[cid] = count
+        clusters = heapq.nlargest(max(0, budget - len(shown)), hidden, key=lambda c: (hidden[c], str(c)))
+
+        view = nx.DiGraph(lod=True)
+        for n, role in shown.items():
+            view.add_node(n, role=role)
+        for cid in clusters:
+            view.add_node(("cluster", cid), role="cluster", members=hidden[cid], label=f"{cid} (+{hidden[cid]})")
+        shown_clusters = set(clusters)
+
+        def rep(n):
+            if n in shown:
+                return n
+            cid = assignment.get(n)
+            return ("cluster", cid) if cid in shown_clusters else None
+
+        # Edges touching explicit nodes come from their adjacency; edges
+        # between clusters are sampled from each cluster's top members.
+        weights = {}
+        for n in shown:
+            for m, data in nx_graph.succ[n].items():
+                self._add_view_edge(weights, n, rep(m), data)
+            for m, data in nx_graph.pred[n].items():
+                if m not in shown:
+                    self._add_view_edge(weights, rep(m), n, data)
+        for cid in clusters:
+            members = communities.members.get(cid, ())
+            if len(members) > 20:
+                members = heapq.nlargest(20, members, key=lambda m: (nx_graph.degree(m), str(m)))
+            for m in members:
+                if m in shown or m not in nx_graph:
+                    continue
+                for t, data in nx_graph.succ[m].items():
+                    target = rep(t)
+                    if target is not None and target != ("cluster", cid):
+                        self._add_view_edge(weights, ("cluster", cid), target, data)
+        # Edges dominate drawing time, so only the budgeted number is kept:
+        # those on the ego network first, then the heaviest.
+        def edge_rank(edge):
+            (u, v), (weight, _) = edge
+            return (u in shown and shown[u] != "member") or (v in shown and shown[v] != "member"), weight, str(edge[0])
+
+        for (u, v), (weight, relation) in heapq.nlargest(self.edge_budget, weights.items(), key=edge_rank):
+            view.add_edge(u, v, weight=weight, **({"relation": relation} if relation else {}))
+        return view
+
+    @staticmethod
+    def _add_view_edge(weights, u, v, data):
+        if u is None or v is None or u == v:
+            return
+        weight, relation = weights.get((u, v), (0, None))
+        # Relation labels are only kept for edges between two real entities.
+        explicit = not isinstance(u, tuple) and not isinstance(v, tuple)
+        weights[(u, v)] = (weight + data.get("weight", 1), data.get("relation", "") if explicit else None)
+
+    def _on_click(self, event):
+        # Left click on a cluster expands it; left click on an expanded
+        # member collapses its cluster again; right click collapses all.
+        if self._graph is None or event.xdata is None or not self._pos:
+            return
+        if event.button == 3:
+            if self._expanded:
+                self._expanded = set()
+                self.update_graph(self._graph)
+            return
+        node = min(self._pos, key=lambda n: (self._pos[n][0] - event.xdata) ** 2 + (self._pos[n][1] - event.ydata) ** 2)
+        x, y = self._pos[node]
+        xmin, xmax = self.ax.get_xlim()
+        if math.hypot(x - event.xdata, y - event.ydata) > 0.03 * (xmax - xmin):
+            return
+        if isinstance(node, tuple) and node[0] == "cluster":
+            self._expanded.add(node[1])
+        else:
+            cid = self._communities.assignment.get(node)
+            if cid not in self._expanded:
+                return
+            self._expanded.discard(cid)
+        self.update_graph(self._graph)
+
+    def _layout(self, nx_graph):
+        node_count = nx_graph.number_of_nodes()
+        self._pos = {n: p for n, p in self._pos.items() if n in nx_graph}
+        new_nodes = [n for n in nx_graph.nodes if n not in self._pos]
+
+        if not self._pos:
+            if node_count <= 15:
+                try:
+                    return nx.kamada_kawai_layout(nx_graph)
+                except Exception:
+                    return nx.spring_layout(nx_graph, k=1.2, iterations=200, seed=42)
+            k = 1.5 / max(1.0, math.sqrt(node_count))
+            try:
+                return nx.spring_layout(nx_graph, k=k, iterations=400, seed=42)
+            except Exception:
+                return nx.circular_layout(nx_graph)
+
+        if not new_nodes:
+            return self._pos
+
+        # Seed each new node next to its already placed neighbors (or at a
+        # random spot when it has none), then refine briefly from there.
+        init = dict(self._pos)
+        for n in new_nodes:
+            placed = [init[m] for m in nx.all_neighbors(nx_graph, n) if m in init]
+            if placed:
+                x = sum(p[0] for p in placed) / len(placed)
+                y = sum(p[1] for p in placed) / len(placed)
+            else:
+                x, y = self._rng.uniform(-1, 1), self._rng.uniform(-1, 1)
+            init[n] = (x + self._rng.uniform(-0.05, 0.05), y + self._rng.uniform(-0.05, 0.05))
+
+        k = 1.5 / max(1.0, math.sqrt(node_count))
+        try:
+            return nx.spring_layout(nx_graph, pos=init, k=k, iterations=self.refine_iterations, seed=42)
+        except Exception:
+            return init
+
+    def _redraw(self, nx_graph):
         self.ax.clear()
 
         if nx_graph is None or len(nx_graph.nodes) == 0:
+            self._pos = {}
             self.ax.text(0.5, 0.5, "No relationships extracted yet...", ha="center", va="center", fontsize=12)
             self.ax.axis("off")
             self.canvas.draw_idle()
             return
 
         node_count = nx_graph.number_of_nodes()
-        if node_count <= 15:
-            try:
-                pos = nx.kamada_kawai_layout(nx_graph)
-            except Exception:
-                pos = nx.spring_layout(nx_graph, k=1.2, iterations=200, seed=42)
-        else:
-            k = 1.5 / max(1.0, math.sqrt(node_count))
-            try:
-                pos = nx.spring_layout(nx_graph, k=k, iterations=400, seed=42)
-            except Exception:
-                pos = nx.circular_layout(nx_graph)
+        with tracing.span("viz.layout", nodes=node_count):
+            pos = self._layout(nx_graph)
+        self._pos = pos
 
+        with tracing.span("viz.draw", nodes=node_count):
+            self._draw(nx_graph, pos)
+
+    def _draw(self, nx_graph, pos):
+        node_count = nx_graph.number_of_nodes()
         degrees = dict(nx_graph.degree())
-        node_sizes = [280 + int(520 * math.log(degrees.get(n, 0) + 1)) for n in nx_graph.nodes]
+        lod = nx_graph.graph.get("lod", False)
+        if lod:
+            # Super-nodes grow with the number of entities they stand for.
+            attrs = nx_graph.nodes
+            node_sizes = [
+                400 + int(300 * math.log(attrs[n]["members"] + 1)) if attrs[n]["role"] == "cluster"
+                else 280 + int(520 * math.log(degrees.get(n, 0) + 1))
+                for n in nx_graph.nodes
+            ]
+            colors = {"cluster": "#f4b183", "focus": "gold", "ego": "skyblue", "member": "#b4e0b4"}
+            node_colors = [colors[attrs[n]["role"]] for n in nx_graph.nodes]
+        else:
+            node_sizes = [280 + int(520 * math.log(degrees.get(n, 0) + 1)) for n in nx_graph.nodes]
+            node_colors = "skyblue"
 
-        nx.draw_networkx_nodes(nx_graph, pos, ax=self.ax, node_color="skyblue", node_size=node_sizes, edgecolors="k")
+        nx.draw_networkx_nodes(nx_graph, pos, ax=self.ax, node_color=node_colors, node_size=node_sizes, edgecolors="k")
 
-        edges = list(nx_graph.edges())
-        for idx, (u, v) in enumerate(edges):
+        # Edges sharing a curvature and hub style are drawn in one call.
+        groups = {}
+        for idx, (u, v) in enumerate(nx_graph.edges()):
             du = degrees.get(u, 0)
             dv = degrees.get(v, 0)
             hub = du > 10 or dv > 10
             base = 0.1 if hub else 0.06
             offset = ((idx % 5) - 2) / 2.0
             rad = base * offset
+            groups.setdefault((rad, hub), []).append((u, v))
+        for (rad, hub), edgelist in groups.items():
             nx.draw_networkx_edges(
                 nx_graph,
                 pos,
                 ax=self.ax,
-                edgelist=[(u, v)],
+                edgelist=edgelist,
                 edge_color="#888888",
                 arrows=True,
                 arrowsize=12,
@@ -61,10 +338,17 @@ class GraphVisualizer:
                 alpha=0.6 if hub else 0.8,
                 connectionstyle=f"arc3,rad={rad}",
             )
-        sorted_nodes = sorted(nx_graph.nodes, key=lambda n: degrees.get(n, 0), reverse=True)
-        max_labeled = 35 if node_count > 80 else 50
-        label_nodes = set(sorted_nodes[:max_labeled])
-        labels = {n: n for n in nx_graph.nodes if n in label_nodes}
+        if lod:
+            # Clusters and the question's own entities are always labeled.
+            attrs = nx_graph.nodes
+            labels = {n: attrs[n].get("label", n) for n in nx_graph.nodes if attrs[n]["role"] in ("cluster", "focus")}
+            rest = sorted((n for n in nx_graph.nodes if n not in labels), key=lambda n: degrees.get(n, 0), reverse=True)
+            labels.update((n, n) for n in rest[:max(0, 50 - len(labels))])
+        else:
+            sorted_nodes = sorted(nx_graph.nodes, key=lambda n: degrees.get(n, 0), reverse=True)
+            max_labeled = 35 if node_count > 80 else 50
+            label_nodes = set(sorted_nodes[:max_labeled])
+            labels = {n: n for n in nx_graph.nodes if n in label_nodes}
 
         nx.draw_networkx_labels(nx_graph, pos, labels=labels, ax=self.ax, font_size=7, font_weight="normal")
 
@@ -76,4 +360,3 @@ class GraphVisualizer:
         self.ax.margins(0.25)
         self.fig.tight_layout(pad=2.0)
         self.canvas.draw_idle()
-